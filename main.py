@@ -1,8 +1,11 @@
 import logging
+import time
 import pandas as pd
 
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Callable, List, Optional
+from typing import Callable, Dict, Iterable, List, Optional
+from botocore.exceptions import ClientError
 from scystream.sdk.core import entrypoint
 from scystream.sdk.env.settings import (
     EnvSettings,
@@ -16,9 +19,22 @@ from scystream.sdk.database_handling.database_manager import (
     PandasDatabaseOperations,
 )
 
+from preprocessing.compression import codec_extension
 from preprocessing.core import Preprocessor
-from preprocessing.loader import CSVLoader, TxtLoader, BibLoader
+from preprocessing.incremental import (
+    IncrementalPostgresSink,
+    content_hash,
+    duplicate_ids,
+)
+from preprocessing.loader import (
+    CSVLoader,
+    TxtLoader,
+    BibLoader,
+    ParquetLoader,
+)
 from preprocessing.models import DocumentRecord, PreprocessedDocument
+from preprocessing.phrases import PhraseModel
+from preprocessing.profiling import RunProfiler
 
 logging.basicConfig(
     level=logging.INFO,
@@ -26,6 +42,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+NOT_FOUND_CODES = ("404", "NoSuchKey", "NotFound")
+
 
 class NormalizedDocsOutput(DatabaseSettings, OutputSettings):
     __identifier__ = "normalized_docs"
@@ -45,6 +63,7 @@ class BIBFileInput(FileSettings, InputSettings):
     __identifier__ = "bib_file"
     FILE_EXT: str = "bib"
 
+    # One attribute or several, comma separated (e.g. "title,abstract")
     SELECTED_ATTRIBUTE: str = "Abstract"
 
 
@@ -52,10 +71,25 @@ class CSVFileInput(FileSettings, InputSettings):
     __identifier__ = "csv_file"
     FILE_EXT: str = "csv"
 
+    # One attribute or several, comma separated (e.g. "title,abstract")
+    SELECTED_ATTRIBUTE: str = "abstract"
+    ID_COLUMN: str = "id"
+
+
+class ParquetFileInput(FileSettings, InputSettings):
+    __identifier__ = "parquet_file"
+    FILE_EXT: str = "parquet"
+
+    # One attribute or several, comma separated (e.g. "title,abstract")
     SELECTED_ATTRIBUTE: str = "abstract"
     ID_COLUMN: str = "id"
 
 
+class NormalizedParquetOutput(FileSettings, OutputSettings):
+    __identifier__ = "normalized_docs_parquet"
+    FILE_EXT: str = "parquet"
+
+
 class NormalizedBIBOutput(FileSettings, OutputSettings):
     __identifier__ = "normalized_overwritten_file_output"
     FILE_EXT: str = "bib"
@@ -73,6 +107,23 @@ class PreprocessTXT(EnvSettings):
     USE_NGRAMS: bool = True
     NGRAM_MIN: int = 2
     NGRAM_MAX: int = 3
+    MAX_MEMORY_MB: int = 0
+    NGRAM_MODE: str = "all"
+    PHRASE_THRESHOLD: float = 0.5
+    PHRASE_MIN_COUNT: int = 5
+    # Stored as PHRASE_MODEL_FILE_PATH/PHRASE_MODEL_NAME.json in the bucket
+    # of the input file, empty to fit a new model on every run
+    PHRASE_MODEL_NAME: str = ""
+    PHRASE_MODEL_FILE_PATH: str = "phrase_models"
+    PHRASE_MODEL_REFIT: bool = False
+    PROFILE: bool = False
+    PROFILER: str = "sampling"
+    PROFILE_ALLOCATIONS: bool = False
+    PROFILE_FILE_PATH: str = "profiles"
+    INCREMENTAL: bool = False
+    DELETE_MISSING: bool = False
+    # Compression of the overwritten file output: none, gzip or zstd
+    OUTPUT_COMPRESSION: str = "none"
 
     TXT_DOWNLOAD_PATH: str = "/tmp/input.txt"
 
@@ -88,6 +139,26 @@ class PreprocessBIB(EnvSettings):
     USE_NGRAMS: bool = True
     NGRAM_MIN: int = 2
     NGRAM_MAX: int = 3
+    MAX_MEMORY_MB: int = 0
+    NGRAM_MODE: str = "all"
+    PHRASE_THRESHOLD: float = 0.5
+    PHRASE_MIN_COUNT: int = 5
+    # Stored as PHRASE_MODEL_FILE_PATH/PHRASE_MODEL_NAME.json in the bucket
+    # of the input file, empty to fit a new model on every run
+    PHRASE_MODEL_NAME: str = ""
+    PHRASE_MODEL_FILE_PATH: str = "phrase_models"
+    PHRASE_MODEL_REFIT: bool = False
+    PROFILE: bool = False
+    PROFILER: str = "sampling"
+    PROFILE_ALLOCATIONS: bool = False
+    PROFILE_FILE_PATH: str = "profiles"
+    INCREMENTAL: bool = False
+    DELETE_MISSING: bool = False
+    # Compression of the overwritten file output: none, gzip or zstd
+    OUTPUT_COMPRESSION: str = "none"
+    # Text normalization workers while loading, 0 uses all cores
+    LOADER_WORKERS: int = 1
+    LOADER_EXECUTOR: str = "auto"
 
     BIB_DOWNLOAD_PATH: str = "/tmp/input.bib"
 
@@ -103,6 +174,24 @@ class PreprocessCSV(EnvSettings):
     USE_NGRAMS: bool = True
     NGRAM_MIN: int = 2
     NGRAM_MAX: int = 3
+    MAX_MEMORY_MB: int = 0
+    NGRAM_MODE: str = "all"
+    PHRASE_THRESHOLD: float = 0.5
+    PHRASE_MIN_COUNT: int = 5
+    # Stored as PHRASE_MODEL_FILE_PATH/PHRASE_MODEL_NAME.json in the bucket
+    # of the input file, empty to fit a new model on every run
+    PHRASE_MODEL_NAME: str = ""
+    PHRASE_MODEL_FILE_PATH: str = "phrase_models"
+    PHRASE_MODEL_REFIT: bool = False
+    PROFILE: bool = False
+    PROFILER: str = "sampling"
+    PROFILE_ALLOCATIONS: bool = False
+    PROFILE_FILE_PATH: str = "profiles"
+    INCREMENTAL: bool = False
+    DELETE_MISSING: bool = False
+    # Text normalization workers while loading, 0 uses all cores
+    LOADER_WORKERS: int = 1
+    LOADER_EXECUTOR: str = "auto"
 
     CSV_DOWNLOAD_PATH: str = "/tmp/input.csv"
 
@@ -114,111 +203,554 @@ class PreprocessCSV(EnvSettings):
 #    normalized_overwritten_file_output: NormalizedCSVOutput
 
 
+class PreprocessParquet(EnvSettings):
+    LANGUAGE: str = "en"
+    FILTER_STOPWORDS: bool = True
+    UNIGRAM_NORMALIZER: str = "lemma"
+    USE_NGRAMS: bool = True
+    NGRAM_MIN: int = 2
+    NGRAM_MAX: int = 3
+    MAX_MEMORY_MB: int = 0
+    NGRAM_MODE: str = "all"
+    PHRASE_THRESHOLD: float = 0.5
+    PHRASE_MIN_COUNT: int = 5
+    # Stored as PHRASE_MODEL_FILE_PATH/PHRASE_MODEL_NAME.json in the bucket
+    # of the input file, empty to fit a new model on every run
+    PHRASE_MODEL_NAME: str = ""
+    PHRASE_MODEL_FILE_PATH: str = "phrase_models"
+    PHRASE_MODEL_REFIT: bool = False
+    PROFILE: bool = False
+    PROFILER: str = "sampling"
+    PROFILE_ALLOCATIONS: bool = False
+    PROFILE_FILE_PATH: str = "profiles"
+    DICTIONARY_ENCODE_TOKENS: bool = False
+
+    PARQUET_DOWNLOAD_PATH: str = "/tmp/input.parquet"
+
+    parquet_input: ParquetFileInput
+    normalized_docs_parquet_output: NormalizedParquetOutput
+
+
+def _group_by_attribute(
+    preprocessed_ouput: list[PreprocessedDocument],
+) -> Dict[Optional[str], List[PreprocessedDocument]]:
+    groups: Dict[Optional[str], List[PreprocessedDocument]] = {}
+    for doc in preprocessed_ouput:
+        groups.setdefault(doc.attribute, []).append(doc)
+
+    return groups or {None: []}
+
+
+def _attribute_table(table: str, attribute: Optional[str], multi: bool):
+    """With several selected attributes, each one gets its own table."""
+    return f"{table}_{attribute.lower()}" if multi else table
+
+
 def _write_preprocessed_docs_to_postgres(
     preprocessed_ouput: list[PreprocessedDocument],
     settings: DatabaseSettings,
 ):
-    df = pd.DataFrame(
-        [{"doc_id": d.doc_id, "tokens": d.tokens} for d in preprocessed_ouput]
-    )
+    groups = _group_by_attribute(preprocessed_ouput)
+    db = PandasDatabaseOperations(settings.DB_DSN, settings.DB_SCHEMA)
+
+    for attribute, docs in groups.items():
+        table = _attribute_table(
+            settings.DB_TABLE, attribute, multi=len(groups) > 1
+        )
+        df = pd.DataFrame(
+            [{"doc_id": d.doc_id, "tokens": d.tokens} for d in docs]
+        )
+
+        logger.info(
+            "Writing %s processed documents to DB table '%s'…",
+            len(df),
+            table,
+        )
+        db.write(table=table, data=df)
+
+        logger.info(
+            "Successfully stored normalized documents into '%s'.",
+            table,
+        )
+
+
+def _write_preprocessed_docs_to_parquet(
+    preprocessed_ouput: list[PreprocessedDocument],
+    settings: FileSettings,
+    dictionary_encode: bool = False,
+    output_dir: Path = Path("."),
+):
+    export_path = output_dir / f"normalized_docs.{settings.FILE_EXT}"
 
     logger.info(
-        "Writing %s processed documents to DB table '%s'…",
-        len(df),
-        settings.DB_TABLE,
+        "Writing %s processed documents to Parquet file '%s'…",
+        len(preprocessed_ouput),
+        export_path,
     )
-    db = PandasDatabaseOperations(settings.DB_DSN, settings.DB_SCHEMA)
-    db.write(table=settings.DB_TABLE, data=df)
+    ParquetLoader.write_results(
+        preprocessed_ouput, export_path, dictionary_encode=dictionary_encode
+    )
+    S3Operations.upload(settings, export_path)
 
     logger.info(
-        "Successfully stored normalized documents into '%s'.",
-        settings.DB_TABLE,
+        "Successfully uploaded normalized documents to bucket '%s'.",
+        settings.BUCKET_NAME,
     )
 
 
-def _preprocess_and_store(
-    documents: List[DocumentRecord],
-    overwrite_callback: Optional[Callable],
+def _preprocess_incremental(
+    documents: Iterable[DocumentRecord],
+    pre: Preprocessor,
     settings,
+    keep_unchanged: bool,
 ) -> List[PreprocessedDocument]:
+    """
+    Only run NLP for documents whose content hash changed and upsert them.
+    With `keep_unchanged`, the stored tokens of unchanged documents are
+    returned as well so file outputs stay complete.
+    """
+    # Hashes are compared before any NLP, so all records are needed upfront
+    documents = list(documents)
+    db_settings = settings.normalized_docs_output
+
+    groups: Dict[Optional[str], List[DocumentRecord]] = {}
+    for record in documents:
+        groups.setdefault(record.attribute, []).append(record)
+    groups = groups or {None: []}
+
+    # Rows are keyed by doc_id, repeated IDs would silently be merged
+    for attribute, records in groups.items():
+        duplicates = duplicate_ids(record.doc_id for record in records)
+        if duplicates:
+            raise ValueError(
+                "INCREMENTAL needs unique document IDs, found repeated "
+                f"IDs: {', '.join(duplicates[:5])}. Use the default mode "
+                "to keep every row."
+            )
+
+    # A new phrase model changes the phrases of every document, so it is
+    # fitted on all of them and they are all written again
+    fitted: Optional[Dict[tuple, PreprocessedDocument]] = None
+    if pre.uses_phrases() and pre.phrase_model is None:
+        logger.info("Fitting the phrase model on all documents.")
+        pre.documents = documents
+        fitted = {
+            (doc.attribute, doc.doc_id): doc
+            for doc in pre.generate_normalized_output()
+        }
+
+    fingerprint = pre.fingerprint()
+    sinks, hashes, unchanged, missing = {}, {}, {}, {}
+    changed: List[DocumentRecord] = []
+
+    for attribute, records in groups.items():
+        sink = IncrementalPostgresSink(
+            db_settings.DB_DSN,
+            db_settings.DB_SCHEMA,
+            _attribute_table(
+                db_settings.DB_TABLE, attribute, multi=len(groups) > 1
+            ),
+        )
+        sink.ensure_table()
+        existing = sink.fetch_hashes()
+
+        hashes[attribute] = {}
+        unchanged[attribute] = []
+
+        for record in records:
+            digest = content_hash(record.text, fingerprint)
+            hashes[attribute][record.doc_id] = digest
 
-    logger.info(f"Starting preprocessing with {len(documents)} documents")
+            if existing.get(record.doc_id) == digest:
+                unchanged[attribute].append(record.doc_id)
+            else:
+                changed.append(record)
 
-    pre = Preprocessor(
+        missing[attribute] = set(existing) - set(hashes[attribute])
+        sinks[attribute] = sink
+
+    logger.info(
+        "Incremental run: %s of %s documents changed.",
+        len(changed),
+        len(documents),
+    )
+
+    if fitted is not None:
+        processed = [fitted[(r.attribute, r.doc_id)] for r in changed]
+    else:
+        pre.documents = changed
+        processed = pre.generate_normalized_output()
+
+    by_key = {(doc.attribute, doc.doc_id): doc for doc in processed}
+
+    for attribute, sink in sinks.items():
+        written = sink.upsert(
+            [doc for doc in processed if doc.attribute == attribute],
+            hashes[attribute],
+        )
+        logger.info(
+            "Upserted %s documents into '%s'.", written, sink.table_name
+        )
+
+        # Only after a successful upsert, so a failed run deletes nothing
+        if settings.DELETE_MISSING:
+            removed = sink.delete_missing(missing[attribute])
+            logger.info(
+                "Deleted %s missing documents from '%s'.",
+                removed,
+                sink.table_name,
+            )
+
+        if keep_unchanged:
+            stored = sink.fetch_tokens(unchanged[attribute])
+            for doc_id, tokens in stored.items():
+                by_key.setdefault(
+                    (attribute, doc_id),
+                    PreprocessedDocument(
+                        doc_id=doc_id, tokens=tokens, attribute=attribute
+                    ),
+                )
+
+    # Keep the input order for the file writers
+    return [
+        by_key[(r.attribute, r.doc_id)]
+        for r in documents
+        if (r.attribute, r.doc_id) in by_key
+    ]
+
+
+def _preprocessor_kwargs(settings) -> dict:
+    """Map entrypoint settings to Preprocessor keyword arguments."""
+    return dict(
         language=settings.LANGUAGE,
         filter_stopwords=settings.FILTER_STOPWORDS,
         unigram_normalizer=settings.UNIGRAM_NORMALIZER,
         use_ngrams=settings.USE_NGRAMS,
         ngram_min=settings.NGRAM_MIN,
         ngram_max=settings.NGRAM_MAX,
+        max_memory_mb=settings.MAX_MEMORY_MB,
+        ngram_mode=settings.NGRAM_MODE,
+        phrase_threshold=settings.PHRASE_THRESHOLD,
+        phrase_min_count=settings.PHRASE_MIN_COUNT,
     )
 
-    pre.documents = documents
-    result = pre.generate_normalized_output()
 
-    _write_preprocessed_docs_to_postgres(
-        result, settings.normalized_docs_output
+def _phrase_model_target(
+    settings, store: Optional[FileSettings]
+) -> Optional[FileSettings]:
+    """S3 location of the stored phrase model, if one should be kept."""
+    if (
+        settings.NGRAM_MODE != "phrases"
+        or not settings.USE_NGRAMS
+        or settings.NGRAM_MIN <= 1
+        or not settings.PHRASE_MODEL_NAME
+        or store is None
+    ):
+        return None
+
+    return store.model_copy(
+        update={
+            "FILE_PATH": settings.PHRASE_MODEL_FILE_PATH,
+            "FILE_NAME": settings.PHRASE_MODEL_NAME,
+            "FILE_EXT": "json",
+        }
     )
 
+
+def _load_phrase_model(
+    pre: Preprocessor, target: FileSettings, local_path: Path
+) -> bool:
+    """
+    Download the stored phrase model into `pre`. Returns False if none was
+    stored yet. A model fitted with other settings is rejected.
+    """
+    try:
+        S3Operations.download(target, str(local_path))
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in NOT_FOUND_CODES:
+            logger.info("No stored phrase model yet, fitting a new one.")
+            return False
+        raise
+
+    model = PhraseModel.load(local_path)
+    expected = pre.new_phrase_model().settings()
+
+    if model.settings() != expected:
+        raise ValueError(
+            f"Stored phrase model '{target.FILE_NAME}' was fitted with "
+            f"{model.settings()}, this run uses {expected}. Set "
+            "PHRASE_MODEL_REFIT to replace it or use another "
+            "PHRASE_MODEL_NAME."
+        )
+
+    pre.phrase_model = model
+    return True
+
+
+def _compressed_output(settings: FileSettings, codec: str) -> FileSettings:
+    """Append the codec extension, the writers compress based on it."""
+    extension = codec_extension(codec)
+    if not extension:
+        return settings
+
+    return settings.model_copy(
+        update={"FILE_EXT": f"{settings.FILE_EXT}.{extension}"}
+    )
+
+
+def _preprocess_and_store(
+    documents: Iterable[DocumentRecord],
+    overwrite_callback: Optional[Callable],
+    settings,
+    result_sink: Optional[Callable] = None,
+    overwrite_output: Optional[FileSettings] = None,
+    preprocessor: Optional[Preprocessor] = None,
+    output_dir: Path = Path("."),
+    phrase_model_store: Optional[FileSettings] = None,
+) -> List[PreprocessedDocument]:
+
+    # Documents may be a lazy iterator, they are only counted afterwards
+    logger.info("Starting preprocessing...")
+
+    # The worker service hands in warm instances, one-off runs load a model
+    pre = preprocessor or Preprocessor(**_preprocessor_kwargs(settings))
+
+    phrase_model_target = _phrase_model_target(settings, phrase_model_store)
+    phrase_model_path = output_dir / "phrase_model.json"
+    save_phrase_model = phrase_model_target is not None and (
+        settings.PHRASE_MODEL_REFIT
+        or not _load_phrase_model(pre, phrase_model_target, phrase_model_path)
+    )
+
+    if (
+        pre.uses_phrases()
+        and phrase_model_target is None
+        and getattr(settings, "INCREMENTAL", False)
+    ):
+        logger.warning(
+            "Without PHRASE_MODEL_NAME the phrase model is fitted again on "
+            "every run, so incremental runs process every document."
+        )
+
+    # Postgres is the default sink, columnar entrypoints inject their own
+    if result_sink:
+        pre.documents = documents
+        result = pre.generate_normalized_output()
+        result_sink(result)
+    elif getattr(settings, "INCREMENTAL", False):
+        result = _preprocess_incremental(
+            documents,
+            pre,
+            settings,
+            keep_unchanged=overwrite_callback is not None,
+        )
+    else:
+        pre.documents = documents
+        result = pre.generate_normalized_output()
+        _write_preprocessed_docs_to_postgres(
+            result, settings.normalized_docs_output
+        )
+
+    if save_phrase_model and pre.phrase_model is not None:
+        pre.phrase_model.save(phrase_model_path)
+        S3Operations.upload(phrase_model_target, str(phrase_model_path))
+
     # Overwrite file using injected behavior
     if overwrite_callback:
-        export_path = Path(
-            f"output.{settings.normalized_overwritten_file_output.FILE_EXT}"
-        )
+        export_path = output_dir / f"output.{overwrite_output.FILE_EXT}"
         overwrite_callback(result, export_path)
 
-        S3Operations.upload(
-            settings.normalized_overwritten_file_output, export_path
-        )
+        S3Operations.upload(overwrite_output, export_path)
 
-    logger.info("Preprocessing completed successfully.")
+    logger.info(
+        "Preprocessing completed successfully with %s documents.", len(result)
+    )
     return result
 
 
-@entrypoint(PreprocessTXT)
-def preprocess_txt_file(settings):
-    logger.info("Downloading TXT file...")
-    S3Operations.download(settings.txt_input, settings.TXT_DOWNLOAD_PATH)
+@contextmanager
+def _profiled(
+    settings,
+    s3_settings: FileSettings,
+    run_name: str,
+    output_dir: Path,
+):
+    """
+    Profile the wrapped run if PROFILE is set and upload the reports to
+    `PROFILE_FILE_PATH` in the bucket of `s3_settings`, also for failed runs.
+    """
+    if not settings.PROFILE:
+        yield
+        return
+
+    profiler = RunProfiler(
+        output_dir=output_dir / "profile",
+        mode=settings.PROFILER,
+        trace_allocations=settings.PROFILE_ALLOCATIONS,
+    )
+    prefix = f"{run_name}_{time.strftime('%Y%m%dT%H%M%S')}"
+
+    try:
+        with profiler:
+            yield
+    finally:
+        for artifact in profiler.artifacts:
+            target = s3_settings.model_copy(
+                update={
+                    "FILE_PATH": settings.PROFILE_FILE_PATH,
+                    "FILE_NAME": f"{prefix}_{artifact.stem}",
+                    "FILE_EXT": artifact.suffix.lstrip("."),
+                }
+            )
+            try:
+                S3Operations.upload(target, str(artifact))
+            except Exception:
+                logger.exception("Uploading profile %s failed.", artifact)
+
+        logger.info(
+            "Uploaded %s profiling reports to '%s/%s'.",
+            len(profiler.artifacts),
+            settings.PROFILE_FILE_PATH,
+            prefix,
+        )
 
-    documents = TxtLoader.load(settings.TXT_DOWNLOAD_PATH)
 
-    _preprocess_and_store(
-        documents=documents,
-        overwrite_callback=TxtLoader.overwrite_with_results,
-        settings=settings,
+@entrypoint(PreprocessTXT)
+def preprocess_txt_file(
+    settings,
+    preprocessor: Optional[Preprocessor] = None,
+    output_dir: Path = Path("."),
+):
+    # Resolved upfront so a bad OUTPUT_COMPRESSION fails before any work
+    output_settings = _compressed_output(
+        settings.normalized_overwritten_file_output,
+        settings.OUTPUT_COMPRESSION,
     )
 
+    with _profiled(
+        settings,
+        settings.normalized_overwritten_file_output,
+        "preprocess_txt_file",
+        output_dir,
+    ):
+        logger.info("Downloading TXT file...")
+        S3Operations.download(settings.txt_input, settings.TXT_DOWNLOAD_PATH)
+
+        return _preprocess_and_store(
+            documents=TxtLoader.iter_records(settings.TXT_DOWNLOAD_PATH),
+            overwrite_callback=TxtLoader.overwrite_with_results,
+            settings=settings,
+            overwrite_output=output_settings,
+            preprocessor=preprocessor,
+            output_dir=output_dir,
+            phrase_model_store=settings.txt_input,
+        )
 
-@entrypoint(PreprocessBIB)
-def preprocess_bib_file(settings):
-    logger.info("Downloading BIB file...")
-    S3Operations.download(settings.bib_input, settings.BIB_DOWNLOAD_PATH)
 
-    loader = BibLoader(
-        file_path=settings.BIB_DOWNLOAD_PATH,
-        attribute=settings.bib_input.SELECTED_ATTRIBUTE,
+@entrypoint(PreprocessBIB)
+def preprocess_bib_file(
+    settings,
+    preprocessor: Optional[Preprocessor] = None,
+    output_dir: Path = Path("."),
+):
+    output_settings = _compressed_output(
+        settings.normalized_overwritten_file_output,
+        settings.OUTPUT_COMPRESSION,
     )
 
-    _preprocess_and_store(
-        documents=loader.document_records,
-        overwrite_callback=loader.overwrite_with_results,
-        settings=settings,
-    )
+    with _profiled(
+        settings,
+        settings.normalized_overwritten_file_output,
+        "preprocess_bib_file",
+        output_dir,
+    ):
+        logger.info("Downloading BIB file...")
+        S3Operations.download(settings.bib_input, settings.BIB_DOWNLOAD_PATH)
+
+        loader = BibLoader(
+            file_path=settings.BIB_DOWNLOAD_PATH,
+            attribute=settings.bib_input.SELECTED_ATTRIBUTE,
+            workers=settings.LOADER_WORKERS,
+            executor=settings.LOADER_EXECUTOR,
+        )
+
+        return _preprocess_and_store(
+            documents=loader.iter_document_records(),
+            overwrite_callback=loader.overwrite_with_results,
+            settings=settings,
+            overwrite_output=output_settings,
+            preprocessor=preprocessor,
+            output_dir=output_dir,
+            phrase_model_store=settings.bib_input,
+        )
 
 
 @entrypoint(PreprocessCSV)
-def preprocess_csv_file(settings):
-    logger.info("Downloading CSV file...")
-    S3Operations.download(settings.csv_input, settings.CSV_DOWNLOAD_PATH)
-
-    loader = CSVLoader(
-        file_path=settings.CSV_DOWNLOAD_PATH,
-        attribute=settings.csv_input.SELECTED_ATTRIBUTE,
-        id_column=settings.csv_input.ID_COLUMN,
-    )
+def preprocess_csv_file(
+    settings,
+    preprocessor: Optional[Preprocessor] = None,
+    output_dir: Path = Path("."),
+):
+    # There is no file output, reports go to the input bucket
+    with _profiled(
+        settings, settings.csv_input, "preprocess_csv_file", output_dir
+    ):
+        logger.info("Downloading CSV file...")
+        S3Operations.download(settings.csv_input, settings.CSV_DOWNLOAD_PATH)
+
+        loader = CSVLoader(
+            file_path=settings.CSV_DOWNLOAD_PATH,
+            attribute=settings.csv_input.SELECTED_ATTRIBUTE,
+            id_column=settings.csv_input.ID_COLUMN,
+            workers=settings.LOADER_WORKERS,
+            executor=settings.LOADER_EXECUTOR,
+        )
 
-    _preprocess_and_store(
-        documents=loader.document_records,
-        overwrite_callback=None,
-        settings=settings,
-    )
+        return _preprocess_and_store(
+            documents=loader.iter_document_records(),
+            overwrite_callback=None,
+            settings=settings,
+            preprocessor=preprocessor,
+            output_dir=output_dir,
+            phrase_model_store=settings.csv_input,
+        )
+
+
+@entrypoint(PreprocessParquet)
+def preprocess_parquet_file(
+    settings,
+    preprocessor: Optional[Preprocessor] = None,
+    output_dir: Path = Path("."),
+):
+    with _profiled(
+        settings,
+        settings.normalized_docs_parquet_output,
+        "preprocess_parquet_file",
+        output_dir,
+    ):
+        logger.info("Downloading Parquet file...")
+        S3Operations.download(
+            settings.parquet_input, settings.PARQUET_DOWNLOAD_PATH
+        )
+
+        loader = ParquetLoader(
+            file_path=settings.PARQUET_DOWNLOAD_PATH,
+            attribute=settings.parquet_input.SELECTED_ATTRIBUTE,
+            id_column=settings.parquet_input.ID_COLUMN,
+        )
+
+        # Streamed batch by batch into the NLP stage
+        return _preprocess_and_store(
+            documents=loader.iter_document_records(),
+            overwrite_callback=None,
+            settings=settings,
+            result_sink=lambda result: _write_preprocessed_docs_to_parquet(
+                result,
+                settings.normalized_docs_parquet_output,
+                dictionary_encode=settings.DICTIONARY_ENCODE_TOKENS,
+                output_dir=output_dir,
+            ),
+            preprocessor=preprocessor,
+            output_dir=output_dir,
+            phrase_model_store=settings.parquet_input,
+        )
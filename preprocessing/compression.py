@@ -0,0 +1,109 @@
+import gzip
+import io
+import logging
+import zstandard
+
+from pathlib import Path
+from typing import IO, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+# Output compression setting -> file extension
+CODEC_EXTENSIONS = {"none": "", "gzip": "gz", "zstd": "zst"}
+
+_SUFFIX_CODECS = {
+    ".gz": "gzip",
+    ".gzip": "gzip",
+    ".zst": "zstd",
+    ".zstd": "zstd",
+}
+
+PathLike = Union[str, Path]
+
+
+def codec_extension(codec: str) -> str:
+    """File extension for an output compression setting, "" for none."""
+    try:
+        return CODEC_EXTENSIONS[codec]
+    except KeyError:
+        raise ValueError(
+            f"Unknown compression '{codec}', expected one of: "
+            f"{', '.join(CODEC_EXTENSIONS)}."
+        ) from None
+
+
+def codec_from_suffix(path: PathLike) -> Optional[str]:
+    return _SUFFIX_CODECS.get(Path(path).suffix.lower())
+
+
+def detect_codec(path: PathLike) -> Optional[str]:
+    """
+    Codec of an existing file, by extension or else by its magic bytes,
+    since downloads are often stored under a plain name like input.txt.
+    """
+    codec = codec_from_suffix(path)
+    if codec:
+        return codec
+
+    with open(path, "rb") as f:
+        magic = f.read(len(ZSTD_MAGIC))
+
+    if magic.startswith(GZIP_MAGIC):
+        return "gzip"
+    if magic.startswith(ZSTD_MAGIC):
+        return "zstd"
+    return None
+
+
+def open_binary(path: PathLike, mode: str = "rb") -> IO[bytes]:
+    """
+    Open a file for binary streaming, decompressing on read and
+    compressing on write. Readers detect the codec, writers pick it from
+    the extension of `path`.
+    """
+    if mode not in ("rb", "wb"):
+        raise ValueError(f"Unsupported mode '{mode}'.")
+
+    codec = detect_codec(path) if mode == "rb" else codec_from_suffix(path)
+
+    if codec == "gzip":
+        return gzip.open(path, mode, compresslevel=GZIP_LEVEL)
+
+    if codec == "zstd":
+        raw = open(path, mode)
+        if mode == "rb":
+            stream = zstandard.ZstdDecompressor().stream_reader(
+                raw, closefd=True
+            )
+            return io.BufferedReader(stream)
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(
+            raw, closefd=True
+        )
+
+    return open(path, mode)
+
+
+def open_text(
+    path: PathLike,
+    mode: str = "r",
+    encoding: str = "utf-8",
+    newline: Optional[str] = None,
+) -> IO[str]:
+    """Text counterpart of `open_binary`."""
+    if mode not in ("r", "w"):
+        raise ValueError(f"Unsupported mode '{mode}'.")
+
+    codec = detect_codec(path) if mode == "r" else codec_from_suffix(path)
+    if codec is None:
+        return open(path, mode, encoding=encoding, newline=newline)
+
+    logger.debug("Opening %s as %s stream.", path, codec)
+    return io.TextIOWrapper(
+        open_binary(path, mode + "b"), encoding=encoding, newline=newline
+    )
@@ -1,9 +1,13 @@
+import json
 import logging
 import spacy
 
-from typing import Literal, List
+from contextlib import nullcontext
+from typing import Iterable, Iterator, Literal, List, Optional, Tuple
 from nltk.stem.porter import PorterStemmer
+from preprocessing.memory import MemoryGovernor
 from preprocessing.models import PreprocessedDocument, DocumentRecord
+from preprocessing.phrases import PhraseModel
 
 LANG_TO_SPACY_MODELS = {"en": "en_core_web_sm", "de": "de_core_news_sm"}
 logger = logging.getLogger(__name__)
@@ -18,7 +22,15 @@ class Preprocessor:
         use_ngrams: bool = True,
         ngram_min: int = 2,
         ngram_max: int = 3,
+        max_memory_mb: int = 0,
+        ngram_mode: Literal["all", "phrases"] = "all",
+        phrase_threshold: float = 0.5,
+        phrase_min_count: int = 5,
     ):
+        # Checked before the model load, which can take a while
+        if ngram_mode not in ("all", "phrases"):
+            raise ValueError(f"Unknown ngram mode '{ngram_mode}'.")
+
         logger.info(
             "Init Preprocessor (lang=%s, filter_stopwords=%s, ngrams=%s)",
             language,
@@ -31,6 +43,10 @@ class Preprocessor:
         self.use_ngrams = use_ngrams
         self.ngram_min = ngram_min
         self.ngram_max = ngram_max
+        self.ngram_mode = ngram_mode
+        self.phrase_threshold = phrase_threshold
+        self.phrase_min_count = phrase_min_count
+        self.governor = MemoryGovernor(max_memory_mb=max_memory_mb)
 
         self.nlp_model = LANG_TO_SPACY_MODELS.get(language, "en_core_web_sm")
         try:
@@ -39,7 +55,53 @@ class Preprocessor:
             spacy.cli.download(self.nlp_model)
             self.nlp = spacy.load(self.nlp_model, disable=["ner"])
 
-        self.documents: List[DocumentRecord] = []
+        # A list or a lazy iterator, consumed once per run
+        self.documents: Iterable[DocumentRecord] = []
+        # Fitted on the next run in phrase mode unless set beforehand
+        self.phrase_model: Optional[PhraseModel] = None
+
+    def fingerprint(self) -> str:
+        """
+        Stable description of every setting that affects the output tokens,
+        used to detect documents that need to be processed again.
+        """
+        settings = {
+            "model": self.nlp_model,
+            "model_version": self.nlp.meta.get("version"),
+            "filter_stopwords": self.filter_stopwords,
+            "unigram_normalizer": self.unigram_normalizer,
+            "use_ngrams": self.use_ngrams,
+            "ngram_min": self.ngram_min,
+            "ngram_max": self.ngram_max,
+        }
+        # Only added outside the default mode, so existing hashes stay valid
+        if self.ngram_mode != "all":
+            settings.update(
+                ngram_mode=self.ngram_mode,
+                phrase_threshold=self.phrase_threshold,
+                phrase_min_count=self.phrase_min_count,
+            )
+            # Emitted phrases depend on the fitted model, not just settings
+            if self.phrase_model is not None:
+                settings["phrase_model"] = self.phrase_model.digest()
+        return json.dumps(settings, sort_keys=True)
+
+    def uses_phrases(self) -> bool:
+        """Phrase mode only matters when n-grams are emitted at all."""
+        return (
+            self.ngram_mode == "phrases"
+            and self.use_ngrams
+            and self.ngram_min > 1
+        )
+
+    def new_phrase_model(self) -> PhraseModel:
+        """Unfitted phrase model for the current settings."""
+        return PhraseModel(
+            ngram_min=self.ngram_min,
+            ngram_max=self.ngram_max,
+            threshold=self.phrase_threshold,
+            min_count=self.phrase_min_count,
+        )
 
     def filter_tokens(
         self, tokens: list[spacy.tokens.Token], filter_stopwords: bool = False
@@ -52,35 +114,108 @@ class Preprocessor:
             and len(t.text) > 2
         ]
 
+    def _memory_zone(self):
+        # Strings interned while parsing a batch are freed afterwards, so the
+        # StringStore does not keep growing over long runs
+        memory_zone = getattr(self.nlp, "memory_zone", None)
+        return memory_zone() if memory_zone else nullcontext()
+
+    def iter_normalized_sentences(
+        self,
+    ) -> Iterator[Tuple[DocumentRecord, List[List[str]]]]:
+        """
+        Parse the documents in character-bounded batches and yield every
+        record with the normalized tokens of each of its sentences.
+        """
+        porter = PorterStemmer()
+
+        for batch in self.governor.batches(self.documents):
+            with self._memory_zone():
+                docs = self.nlp.pipe(record.text for record in batch)
+
+                for record, doc in zip(batch, docs):
+                    sentences = []
+                    for sent in doc.sents:
+                        filtered = self.filter_tokens(
+                            list(sent), self.filter_stopwords
+                        )
+                        sentences.append(
+                            [self.normalize_token(t, porter) for t in filtered]
+                        )
+
+                    yield record, sentences
+
+            self.governor.observe()
+
     def generate_normalized_output(self) -> List[PreprocessedDocument]:
         logger.info("Generating normalized output...")
-        porter = PorterStemmer()
+
+        if self.uses_phrases():
+            return self._generate_phrase_output()
+
+        use_ngrams = self.use_ngrams and self.ngram_min > 1
 
         processed_docs: List[PreprocessedDocument] = []
 
-        for record in self.documents:
-            doc = self.nlp(record.text)
+        for record, sentences in self.iter_normalized_sentences():
             doc_terms = []
 
             # Process each sentence
-            for sent in doc.sents:
-                filtered = self.filter_tokens(
-                    list(sent), self.filter_stopwords
-                )
-                normalized = [
-                    self.normalize_token(t, porter) for t in filtered
-                ]
+            for normalized in sentences:
                 doc_terms.extend(normalized)
 
                 # Generate n-grams
-                if self.use_ngrams and self.ngram_min > 1:
+                if use_ngrams:
                     for n in range(self.ngram_min, self.ngram_max + 1):
                         for i in range(len(normalized) - n + 1):
                             ngram = " ".join(normalized[i:i + n])  # fmt: off
                             doc_terms.append(ngram)
 
             processed_docs.append(
-                PreprocessedDocument(doc_id=record.doc_id, tokens=doc_terms)
+                PreprocessedDocument(
+                    doc_id=record.doc_id,
+                    tokens=doc_terms,
+                    attribute=record.attribute,
+                )
+            )
+
+        return processed_docs
+
+    def _generate_phrase_output(self) -> List[PreprocessedDocument]:
+        """
+        Emit unigrams plus only the statistically significant n-grams.
+
+        The documents are parsed once. With a preset `phrase_model` the
+        phrases are emitted while parsing. Otherwise the parsed sentences
+        are counted and kept, the model is fitted and the kept sentences
+        are reused to emit the phrases.
+        """
+        model = self.phrase_model
+        if model is not None:
+            parsed = self.iter_normalized_sentences()
+        else:
+            model = self.new_phrase_model()
+            parsed = []
+            for record, sentences in self.iter_normalized_sentences():
+                model.update(sentences)
+                parsed.append((record, sentences))
+
+            self.phrase_model = model.fit()
+
+        processed_docs: List[PreprocessedDocument] = []
+
+        for record, sentences in parsed:
+            doc_terms = []
+            for normalized in sentences:
+                doc_terms.extend(normalized)
+                doc_terms.extend(model.phrases_in(normalized))
+
+            processed_docs.append(
+                PreprocessedDocument(
+                    doc_id=record.doc_id,
+                    tokens=doc_terms,
+                    attribute=record.attribute,
+                )
             )
 
         return processed_docs
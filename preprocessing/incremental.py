@@ -0,0 +1,203 @@
+import hashlib
+import logging
+
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import (
+    ARRAY,
+    Column,
+    MetaData,
+    Table,
+    Text,
+    create_engine,
+    inspect,
+    select,
+    text,
+)
+from sqlalchemy.dialects.postgresql import insert
+
+from preprocessing.models import PreprocessedDocument
+
+logger = logging.getLogger(__name__)
+
+HASH_COLUMN = "content_hash"
+BATCH_SIZE = 5000
+
+
+def content_hash(text: str, fingerprint: str) -> str:
+    """Hash of a document's text together with the preprocessing settings."""
+    digest = hashlib.sha256()
+    digest.update(fingerprint.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def duplicate_ids(doc_ids: Iterable[str]) -> List[str]:
+    """IDs occurring more than once, which cannot be keyed by doc_id."""
+    return sorted(
+        doc_id for doc_id, count in Counter(doc_ids).items() if count > 1
+    )
+
+
+def _batches(items: List, size: int = BATCH_SIZE) -> Iterable[List]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]  # fmt: off
+
+
+class IncrementalPostgresSink:
+    """
+    Keeps a normalized_docs table in sync by upserting only changed rows.
+
+    The table stores a content hash per doc_id. Rows whose hash did not
+    change are left untouched, changed and new rows are written with
+    `INSERT ... ON CONFLICT (doc_id) DO UPDATE`.
+    """
+
+    def __init__(self, dsn: str, schema: Optional[str], table: str):
+        self.engine = create_engine(dsn, pool_pre_ping=True)
+        self.schema = (schema or "").strip() or None
+        self.table_name = table
+        self.table: Optional[Table] = None
+
+    def _qualified_name(self) -> str:
+        quote = self.engine.dialect.identifier_preparer.quote
+        if self.schema:
+            return f"{quote(self.schema)}.{quote(self.table_name)}"
+        return quote(self.table_name)
+
+    def ensure_table(self) -> None:
+        """
+        Create the table, or migrate one written by the overwrite sink:
+        add the hash column, store tokens as TEXT[] and make doc_id unique.
+        """
+        inspector = inspect(self.engine)
+
+        if not inspector.has_table(self.table_name, schema=self.schema):
+            logger.info("Creating incremental table '%s'.", self.table_name)
+            Table(
+                self.table_name,
+                MetaData(),
+                Column("doc_id", Text, primary_key=True),
+                Column("tokens", ARRAY(Text)),
+                Column(HASH_COLUMN, Text),
+                schema=self.schema,
+            ).create(self.engine)
+        else:
+            columns = {
+                c["name"]: c["type"]
+                for c in inspector.get_columns(
+                    self.table_name, schema=self.schema
+                )
+            }
+            name = self._qualified_name()
+            quote = self.engine.dialect.identifier_preparer.quote
+            index = quote(f"{self.table_name}_doc_id_key")
+
+            # The overwrite sink keeps repeated IDs, a unique index cannot
+            with self.engine.connect() as conn:
+                duplicates = conn.execute(
+                    text(
+                        f"SELECT doc_id FROM {name} GROUP BY doc_id "
+                        "HAVING COUNT(*) > 1 ORDER BY doc_id LIMIT 5"
+                    )
+                ).scalars().all()
+            if duplicates:
+                raise ValueError(
+                    f"Table '{self.table_name}' has repeated doc_ids "
+                    f"({', '.join(map(str, duplicates))}) and cannot be "
+                    "used incrementally."
+                )
+
+            with self.engine.begin() as conn:
+                if HASH_COLUMN not in columns:
+                    conn.execute(
+                        text(
+                            f"ALTER TABLE {name} "
+                            f"ADD COLUMN {HASH_COLUMN} TEXT"
+                        )
+                    )
+                if not isinstance(columns.get("tokens"), ARRAY):
+                    conn.execute(
+                        text(
+                            f"ALTER TABLE {name} ALTER COLUMN tokens "
+                            "TYPE TEXT[] USING tokens::TEXT[]"
+                        )
+                    )
+                conn.execute(
+                    text(
+                        f"CREATE UNIQUE INDEX IF NOT EXISTS {index} "
+                        f"ON {name} (doc_id)"
+                    )
+                )
+
+        self.table = Table(
+            self.table_name,
+            MetaData(),
+            schema=self.schema,
+            autoload_with=self.engine,
+        )
+
+    def fetch_hashes(self) -> Dict[str, Optional[str]]:
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                select(self.table.c.doc_id, self.table.c[HASH_COLUMN])
+            )
+            return {doc_id: value for doc_id, value in rows}
+
+    def fetch_tokens(self, doc_ids: Iterable[str]) -> Dict[str, List[str]]:
+        tokens: Dict[str, List[str]] = {}
+
+        with self.engine.connect() as conn:
+            for batch in _batches(list(doc_ids)):
+                rows = conn.execute(
+                    select(self.table.c.doc_id, self.table.c.tokens).where(
+                        self.table.c.doc_id.in_(batch)
+                    )
+                )
+                tokens.update({doc_id: value or [] for doc_id, value in rows})
+
+        return tokens
+
+    def upsert(
+        self,
+        preprocessed_docs: List[PreprocessedDocument],
+        hashes: Dict[str, str],
+    ) -> int:
+        # A doc_id may only be touched once per statement, the last one wins
+        rows = {
+            doc.doc_id: {
+                "doc_id": doc.doc_id,
+                "tokens": doc.tokens,
+                HASH_COLUMN: hashes[doc.doc_id],
+            }
+            for doc in preprocessed_docs
+        }
+
+        stmt = insert(self.table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[self.table.c.doc_id],
+            set_={
+                "tokens": stmt.excluded.tokens,
+                HASH_COLUMN: stmt.excluded[HASH_COLUMN],
+            },
+        )
+
+        with self.engine.begin() as conn:
+            for batch in _batches(list(rows.values())):
+                conn.execute(stmt, batch)
+
+        return len(rows)
+
+    def delete_missing(self, doc_ids: Set[str]) -> int:
+        if not doc_ids:
+            return 0
+
+        with self.engine.begin() as conn:
+            for batch in _batches(sorted(doc_ids)):
+                conn.execute(
+                    self.table.delete().where(self.table.c.doc_id.in_(batch))
+                )
+
+        return len(doc_ids)
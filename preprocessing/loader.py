@@ -1,14 +1,33 @@
+import bisect
 import logging
+import mmap
+import os
 import re
 import bibtexparser
 import pandas as pd
-from typing import List
+import pyarrow as pa
+import pyarrow.parquet as pq
+from array import array
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Union
 from pathlib import Path
-
-from preprocessing.models import DocumentRecord, PreprocessedDocument
+from bibtexparser.bibdatabase import BibDatabase
+from bibtexparser.bwriter import BibTexWriter
+
+from preprocessing.compression import detect_codec, open_binary, open_text
+from preprocessing.models import (
+    DocumentRecord,
+    PreprocessedDocument,
+    TxtByteRange,
+)
+from preprocessing.parallel import ExecutorKind, check_executor, ordered_map
+from preprocessing.writer import DEFAULT_MAX_BUFFERED, OrderedWriter
 
 logger = logging.getLogger(__name__)
 
+# Texts per chunk handed to a loader worker
+LOAD_CHUNK_SIZE = 2000
+
 
 def normalize_text(text: str) -> str:
     if not text:
@@ -24,48 +43,200 @@ def normalize_text(text: str) -> str:
     return text.strip()
 
 
+def parse_attributes(attribute: Union[str, List[str]]) -> List[str]:
+    """
+    Accept a single attribute, a comma separated list ("title,abstract")
+    or a list of attributes and return the de-duplicated attribute names.
+    """
+    if isinstance(attribute, str):
+        attribute = attribute.split(",")
+
+    attributes = []
+    for name in attribute:
+        name = name.strip()
+        if name and name not in attributes:
+            attributes.append(name)
+
+    if not attributes:
+        raise ValueError("At least one attribute must be selected.")
+
+    return attributes
+
+
+def _normalize_texts(texts: List[str]) -> List[str]:
+    return [normalize_text(text) for text in texts]
+
+
+def normalize_texts_parallel(
+    texts: Iterable[str],
+    workers: int = 1,
+    executor: ExecutorKind = "auto",
+    chunk_size: int = LOAD_CHUNK_SIZE,
+) -> Iterator[str]:
+    """
+    Normalize `texts` in chunks on a worker pool, yielding them in input
+    order as the chunks finish. Texts are read lazily, chunk by chunk.
+    """
+    texts = iter(texts)
+    chunks = iter(lambda: list(islice(texts, chunk_size)), [])
+
+    for normalized in ordered_map(_normalize_texts, chunks, workers, executor):
+        yield from normalized
+
+
 class TxtLoader:
     @staticmethod
     def load(file_path: str) -> list[DocumentRecord]:
-        with open(file_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
+        return list(TxtLoader.iter_records(file_path))
+
+    @staticmethod
+    def _require_uncompressed(file_path: str) -> None:
+        codec = detect_codec(file_path)
+        if codec:
+            raise ValueError(
+                f"Byte ranges need an uncompressed file, got {codec}."
+            )
+
+    @staticmethod
+    def build_line_index(file_path: str) -> array:
+        """
+        Byte offsets of every line start plus a final end-of-file offset,
+        so line `i` (0-based) spans `index[i]:index[i + 1]`.
+        """
+        TxtLoader._require_uncompressed(file_path)
+        index = array("q")
+
+        with open(file_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return index
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                pos = 0
+                while pos < size:
+                    index.append(pos)
+                    newline = mm.find(b"\n", pos)
+                    pos = size if newline == -1 else newline + 1
+
+        index.append(size)
+        return index
+
+    @staticmethod
+    def split_byte_ranges(file_path: str, chunks: int) -> List[TxtByteRange]:
+        """
+        Split the file into at most `chunks` byte ranges of roughly equal
+        size, aligned to line boundaries, that can be read independently.
+        """
+        index = TxtLoader.build_line_index(file_path)
+        if not index:
+            return []
+
+        line_count = len(index) - 1
+        size = index[-1]
+        boundaries = [0]
+
+        for k in range(1, max(chunks, 1)):
+            line = bisect.bisect_left(index, size * k // chunks, 0, line_count)
+            if line > boundaries[-1]:
+                boundaries.append(line)
+        boundaries.append(line_count)
 
         return [
-            DocumentRecord(doc_id=str(i), text=normalize_text(line))
-            for i, line in enumerate(lines, start=1)
+            TxtByteRange(
+                start=index[first], end=index[last], first_line=first + 1
+            )
+            for first, last in zip(boundaries, boundaries[1:])
         ]
 
+    @staticmethod
+    def iter_records(
+        file_path: str, byte_range: Optional[TxtByteRange] = None
+    ) -> Iterator[DocumentRecord]:
+        """
+        Lazily yield one record per line from a memory-mapped file, with the
+        1-based line number as doc_id. With `byte_range`, only the lines of
+        that range are read.
+
+        Compressed files are decompressed as a stream instead, they cannot
+        be memory-mapped or split into byte ranges.
+        """
+        if byte_range:
+            TxtLoader._require_uncompressed(file_path)
+        elif detect_codec(file_path):
+            with open_binary(file_path) as f:
+                for line_no, line in enumerate(f, start=1):
+                    yield DocumentRecord(
+                        doc_id=str(line_no),
+                        text=normalize_text(line.decode("utf-8")),
+                    )
+            return
+
+        with open(file_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                pos, end, line_no = 0, size, 1
+                if byte_range:
+                    pos = byte_range.start
+                    end = byte_range.end
+                    line_no = byte_range.first_line
+
+                while pos < end:
+                    newline = mm.find(b"\n", pos, end)
+                    next_pos = end if newline == -1 else newline + 1
+                    line = mm[pos:next_pos].decode("utf-8")
+
+                    yield DocumentRecord(
+                        doc_id=str(line_no), text=normalize_text(line)
+                    )
+
+                    pos = next_pos
+                    line_no += 1
+
     @staticmethod
     def overwrite_with_results(
-        preprocessed_docs: List[PreprocessedDocument],
+        preprocessed_docs: Iterable[PreprocessedDocument],
         export_path: Path,
+        max_buffered: int = DEFAULT_MAX_BUFFERED,
     ) -> None:
         logger.info("Writing preprocessed TXT file...")
 
-        output_path = Path.cwd() / export_path.name
-
-        # Ensure correct order (IDs are numeric strings)
-        sorted_docs = sorted(preprocessed_docs, key=lambda d: int(d.doc_id))
+        output_path = export_path
 
-        with open(output_path, "w", encoding="utf-8") as f:
-            for doc in sorted_docs:
-                line = " ".join(doc.tokens)
-                f.write(line + "\n")
+        with open_text(output_path, "w") as f:
+            # IDs are 1-based line numbers, results may arrive in any order
+            with OrderedWriter(f.write, max_buffered) as writer:
+                for doc in preprocessed_docs:
+                    line = " ".join(doc.tokens) + "\n"
+                    writer.push(int(doc.doc_id) - 1, line)
 
         logger.info(f"TXT file successfully written to: {output_path}")
 
 
 class BibLoader:
-    def __init__(self, file_path: str, attribute: str):
+    def __init__(
+        self,
+        file_path: str,
+        attribute: Union[str, List[str]],
+        workers: int = 1,
+        executor: ExecutorKind = "auto",
+    ):
+        check_executor(executor)
         logger.info(f"Loading BIB file (attribute={attribute})...")
 
-        with open(file_path, "r", encoding="utf-8") as f:
+        with open_text(file_path) as f:
             self.bib_db = bibtexparser.load(f)
 
         self.file_path = file_path
-        self.attribute = attribute.lower()
+        self.attributes = [a.lower() for a in parse_attributes(attribute)]
+        self.workers = workers
+        self.executor = executor
 
-        self.document_records = self._build_document_records()
+    @property
+    def document_records(self) -> List[DocumentRecord]:
+        return list(self.iter_document_records())
 
     @staticmethod
     def _extract_bib_id(entry: dict) -> str:
@@ -78,117 +249,334 @@ class BibLoader:
             or "UNKNOWN_ID"
         )
 
-    def _build_document_records(self) -> List[DocumentRecord]:
-        records = []
+    def iter_document_records(self) -> Iterator[DocumentRecord]:
+        """
+        Yield one record per entry and attribute in entry order, with the
+        text normalization spread over `workers`. Records are yielded as
+        soon as their chunk is done.
+        """
+        entries = self.bib_db.entries
+
+        raw_values = (
+            entry.get(attribute, "")
+            for entry in entries
+            for attribute in self.attributes
+        )
+        normalized = normalize_texts_parallel(
+            raw_values, self.workers, self.executor
+        )
 
-        for entry in self.bib_db.entries:
+        for entry in entries:
             bib_id = self._extract_bib_id(entry)
-            raw_value = entry.get(self.attribute, "")
-            normalized = normalize_text(raw_value)
 
-            records.append(DocumentRecord(doc_id=bib_id, text=normalized))
-
-        return records
+            for attribute in self.attributes:
+                yield DocumentRecord(
+                    doc_id=bib_id, text=next(normalized), attribute=attribute
+                )
 
     def overwrite_with_results(
-        self, preprocessed_docs: List[PreprocessedDocument], export_path: Path
+        self,
+        preprocessed_docs: Iterable[PreprocessedDocument],
+        export_path: Path,
+        max_buffered: int = DEFAULT_MAX_BUFFERED,
     ) -> None:
         logger.info("Overwriting input documents with preprocessed text...")
 
-        output_path = Path.cwd() / export_path.name
+        output_path = export_path
+        entries = self.bib_db.entries
 
-        preprocessed_dict = {doc.doc_id: doc for doc in preprocessed_docs}
+        # Write entries in the same order as bibtexparser.dump does
+        header_writer = BibTexWriter()
+        header_writer.contents = ["comments", "preambles", "strings"]
+        entry_writer = BibTexWriter()
+        entry_writer.contents = ["entries"]
 
-        for entry in self.bib_db.entries:
-            bib_id = self._extract_bib_id(entry)
-            preprocessed = preprocessed_dict.get(bib_id)
+        order = sorted(
+            range(len(entries)),
+            key=lambda i: BibDatabase.entry_sort_key(
+                entries[i], entry_writer.order_entries_by
+            ),
+        )
+        rank = {index: position for position, index in enumerate(order)}
+
+        entries_by_id: Dict[str, List[int]] = {}
+        for index, entry in enumerate(entries):
+            entries_by_id.setdefault(self._extract_bib_id(entry), []).append(
+                index
+            )
+
+        # An entry is complete once every record sharing its ID has a result
+        # for every selected attribute, the last result wins as before
+        pending = [
+            len(self.attributes)
+            * len(entries_by_id[self._extract_bib_id(entry)])
+            for entry in entries
+        ]
+
+        def entry_to_bibtex(index: int) -> str:
+            single = BibDatabase()
+            single.entries = [entries[index]]
+            separator = entry_writer.entry_separator if rank[index] else ""
+            return separator + entry_writer.write(single)
 
-            if not preprocessed:
-                continue
+        with open_text(output_path, "w") as f:
+            f.write(header_writer.write(self.bib_db))
 
-            entry[self.attribute] = " ".join(preprocessed.tokens)
+            with OrderedWriter(f.write, max_buffered) as writer:
+                for doc in preprocessed_docs:
+                    if doc.attribute not in self.attributes:
+                        continue
 
-        with open(output_path, "w", encoding="utf-8") as f:
-            bibtexparser.dump(self.bib_db, f)
+                    for index in entries_by_id.get(doc.doc_id, []):
+                        entries[index][doc.attribute] = " ".join(doc.tokens)
+                        pending[index] -= 1
+
+                        if pending[index] == 0:
+                            writer.push(rank[index], entry_to_bibtex(index))
+
+                # Entries without (complete) results are written unchanged
+                for index in order:
+                    if pending[index] > 0:
+                        writer.push(rank[index], entry_to_bibtex(index))
 
         logger.info(f"BIB file successfully written to: {output_path}")
 
 
 class CSVLoader:
-    def __init__(self, file_path: str, attribute: str, id_column: str = "id"):
+    def __init__(
+        self,
+        file_path: str,
+        attribute: Union[str, List[str]],
+        id_column: str = "id",
+        workers: int = 1,
+        executor: ExecutorKind = "auto",
+    ):
+        check_executor(executor)
         logger.info(
             f"Loading CSV file (attribute={attribute}, id_column={id_column})."
         )
 
         self.file_path = file_path
-        self.attribute = attribute
+        self.attributes = parse_attributes(attribute)
         self.id_column = id_column
+        self.workers = workers
+        self.executor = executor
 
-        self.df = pd.read_csv(file_path)
+        with open_binary(file_path) as f:
+            self.df = pd.read_csv(f)
 
-        if self.attribute not in self.df.columns:
-            raise ValueError(
-                f"Column '{self.attribute}' not found in CSV file."
-            )
+        for attribute in self.attributes:
+            if attribute not in self.df.columns:
+                raise ValueError(
+                    f"Column '{attribute}' not found in CSV file."
+                )
 
         if self.id_column not in self.df.columns:
             raise ValueError(
                 f"ID column '{self.id_column}' not found in CSV file."
             )
 
-        self.document_records = self._build_document_records()
+    @property
+    def document_records(self) -> List[DocumentRecord]:
+        return list(self.iter_document_records())
 
     @staticmethod
-    def _extract_doc_id(row: pd.Series, id_column: str) -> str:
-        value = row.get(id_column)
-
+    def _format_doc_id(value) -> str:
         if pd.isna(value):
             return "UNKNOWN_ID"
 
         return str(value)
 
-    def _build_document_records(self) -> List[DocumentRecord]:
-        records = []
+    def iter_document_records(self) -> Iterator[DocumentRecord]:
+        """
+        Yield one record per row and attribute in row order, with the text
+        normalization spread over `workers`. Records are yielded as soon as
+        their chunk is done, without copying the columns first.
+        """
+        raw_values = (
+            "" if pd.isna(value) else str(value)
+            for row in zip(*(self.df[a] for a in self.attributes))
+            for value in row
+        )
+        normalized = normalize_texts_parallel(
+            raw_values, self.workers, self.executor
+        )
 
-        for _, row in self.df.iterrows():
-            doc_id = self._extract_doc_id(row, self.id_column)
+        for value in self.df[self.id_column]:
+            doc_id = self._format_doc_id(value)
 
-            raw_value = row.get(self.attribute, "")
+            for attribute in self.attributes:
+                yield DocumentRecord(
+                    doc_id=doc_id, text=next(normalized), attribute=attribute
+                )
 
-            if pd.isna(raw_value):
-                raw_value = ""
+    def overwrite_with_results(
+        self,
+        preprocessed_docs: Iterable[PreprocessedDocument],
+        export_path: Path,
+        max_buffered: int = DEFAULT_MAX_BUFFERED,
+        chunk_size: int = 10000,
+    ) -> None:
+        logger.info("Overwriting CSV documents with preprocessed text...")
 
-            normalized = normalize_text(str(raw_value))
+        output_path = export_path
 
-            records.append(
-                DocumentRecord(
-                    doc_id=doc_id,
-                    text=normalized,
-                )
+        rows_by_id: Dict[str, List[int]] = {}
+        for position, value in enumerate(self.df[self.id_column]):
+            rows_by_id.setdefault(self._format_doc_id(value), []).append(
+                position
             )
 
-        return records
+        # Same completion rule as the BIB writer: all records sharing the
+        # row's ID have a result for every selected attribute
+        pending = [
+            len(self.attributes) * len(rows_by_id[self._format_doc_id(v)])
+            for v in self.df[self.id_column]
+        ]
+        replacements: Dict[int, Dict[str, str]] = {}
+        chunk: List[Dict[str, str]] = []
+        written = 0
 
-    def overwrite_with_results(
+        with open_text(output_path, "w", newline="") as f:
+
+            def write_chunk() -> None:
+                nonlocal written
+
+                start, end = written, written + len(chunk)
+                rows = self.df.iloc[start:end].copy()
+
+                for attribute in self.attributes:
+                    rows[attribute] = [
+                        row.get(attribute, original)
+                        for row, original in zip(chunk, rows[attribute])
+                    ]
+
+                rows.to_csv(f, header=start == 0, index=False)
+                chunk.clear()
+                written = end
+
+            def collect(row: Dict[str, str]) -> None:
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    write_chunk()
+
+            with OrderedWriter(collect, max_buffered) as writer:
+                for doc in preprocessed_docs:
+                    if doc.attribute not in self.attributes:
+                        continue
+
+                    for position in rows_by_id.get(doc.doc_id, []):
+                        row = replacements.setdefault(position, {})
+                        row[doc.attribute] = " ".join(doc.tokens)
+                        pending[position] -= 1
+
+                        if pending[position] == 0:
+                            writer.push(position, replacements.pop(position))
+
+                # Rows without (complete) results are written unchanged
+                for position, count in enumerate(pending):
+                    if count > 0:
+                        writer.push(position, replacements.pop(position, {}))
+
+            write_chunk()
+        logger.info(f"CSV file successfully written to: {output_path}")
+
+
+class ParquetLoader:
+    def __init__(
         self,
+        file_path: str,
+        attribute: Union[str, List[str]],
+        id_column: str = "id",
+        batch_size: int = 65536,
+    ):
+        logger.info(
+            f"Loading Parquet file (attribute={attribute}, "
+            f"id_column={id_column})."
+        )
+
+        self.file_path = file_path
+        self.attributes = parse_attributes(attribute)
+        self.id_column = id_column
+        self.batch_size = batch_size
+
+        columns = pq.read_schema(file_path).names
+
+        for attribute in self.attributes:
+            if attribute not in columns:
+                raise ValueError(
+                    f"Column '{attribute}' not found in Parquet file."
+                )
+
+        if self.id_column not in columns:
+            raise ValueError(
+                f"ID column '{self.id_column}' not found in Parquet file."
+            )
+
+    @property
+    def document_records(self) -> List[DocumentRecord]:
+        return list(self.iter_document_records())
+
+    def iter_document_records(self) -> Iterator[DocumentRecord]:
+        """
+        Stream records batch by batch from a memory-mapped file, reading
+        only the id and attribute columns.
+        """
+        with pa.memory_map(self.file_path, "r") as source:
+            parquet_file = pq.ParquetFile(source)
+
+            for batch in parquet_file.iter_batches(
+                batch_size=self.batch_size,
+                columns=[self.id_column, *self.attributes],
+            ):
+                ids = batch.column(self.id_column).to_pylist()
+                values = {
+                    attribute: batch.column(attribute).to_pylist()
+                    for attribute in self.attributes
+                }
+
+                for i, doc_id in enumerate(ids):
+                    doc_id = "UNKNOWN_ID" if doc_id is None else str(doc_id)
+
+                    for attribute in self.attributes:
+                        raw_value = values[attribute][i]
+
+                        yield DocumentRecord(
+                            doc_id=doc_id,
+                            text=normalize_text(
+                                "" if raw_value is None else str(raw_value)
+                            ),
+                            attribute=attribute,
+                        )
+
+    @staticmethod
+    def write_results(
         preprocessed_docs: List[PreprocessedDocument],
         export_path: Path,
+        dictionary_encode: bool = False,
     ) -> None:
-        logger.info("Overwriting CSV documents with preprocessed text...")
+        logger.info("Writing preprocessed documents to Parquet...")
 
-        output_path = Path.cwd() / export_path.name
+        output_path = export_path
 
-        replacement_map = {
-            doc.doc_id: " ".join(doc.tokens) for doc in preprocessed_docs
+        token_type = (
+            pa.dictionary(pa.int32(), pa.string())
+            if dictionary_encode
+            else pa.string()
+        )
+        fields = [("doc_id", pa.string()), ("tokens", pa.list_(token_type))]
+        columns = {
+            "doc_id": [doc.doc_id for doc in preprocessed_docs],
+            "tokens": [doc.tokens for doc in preprocessed_docs],
         }
 
-        updated_df = self.df.copy()
+        # Only label rows with their source field when several were selected
+        attributes = [doc.attribute for doc in preprocessed_docs]
+        if len(set(attributes)) > 1:
+            fields.append(("attribute", pa.string()))
+            columns["attribute"] = attributes
 
-        updated_df[self.attribute] = (
-            updated_df[self.id_column]
-            .map(replacement_map)
-            .fillna(updated_df[self.attribute])
-        )
+        table = pa.table(columns, schema=pa.schema(fields))
 
-        updated_df.to_csv(output_path, index=False)
-        logger.info(f"CSV file successfully written to: {output_path}")
+        pq.write_table(table, output_path)
+        logger.info(f"Parquet file successfully written to: {output_path}")
@@ -0,0 +1,105 @@
+import logging
+import os
+import resource
+import sys
+
+logger = logging.getLogger(__name__)
+
+# Shrink batches above this share of the limit, grow them below the lower one
+HIGH_WATERMARK = 0.85
+LOW_WATERMARK = 0.6
+
+
+def current_rss_mb() -> float:
+    """Resident set size of this process in MB."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        # No procfs (e.g. macOS), fall back to the peak RSS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+        return peak / divisor
+
+
+class MemoryGovernor:
+    """
+    Sizes NLP batches by their total number of characters and adapts that
+    budget to the process RSS, so long runs stay below `max_memory_mb`.
+
+    With `max_memory_mb=0` the batch size stays fixed.
+    """
+
+    def __init__(
+        self,
+        max_memory_mb: int = 0,
+        batch_chars: int = 100_000,
+        min_batch_chars: int = 5_000,
+        max_batch_chars: int = 5_000_000,
+    ):
+        self.max_memory_mb = max_memory_mb
+        self.min_batch_chars = min_batch_chars
+        self.max_batch_chars = max_batch_chars
+        self.batch_chars = min(
+            max(batch_chars, min_batch_chars), max_batch_chars
+        )
+        # Warned once per stretch above the limit, not after every batch
+        self.limit_warned = False
+
+    def observe(self) -> float:
+        """Check the RSS after a batch and adapt the next batch size."""
+        rss = current_rss_mb()
+        if not self.max_memory_mb:
+            return rss
+
+        if rss <= self.max_memory_mb:
+            self.limit_warned = False
+
+        if rss > self.max_memory_mb * HIGH_WATERMARK:
+            if self.batch_chars > self.min_batch_chars:
+                self.batch_chars = max(
+                    self.batch_chars // 2, self.min_batch_chars
+                )
+                logger.info(
+                    "RSS %.0f MB close to limit of %s MB, batch size now "
+                    "%s characters.",
+                    rss,
+                    self.max_memory_mb,
+                    self.batch_chars,
+                )
+            elif rss > self.max_memory_mb:
+                log = logger.debug if self.limit_warned else logger.warning
+                log(
+                    "RSS %.0f MB exceeds limit of %s MB at minimum batch "
+                    "size.",
+                    rss,
+                    self.max_memory_mb,
+                )
+                self.limit_warned = True
+        elif rss < self.max_memory_mb * LOW_WATERMARK:
+            self.batch_chars = min(
+                int(self.batch_chars * 1.5), self.max_batch_chars
+            )
+
+        return rss
+
+    def batches(self, records):
+        """
+        Group records into batches of at most `batch_chars` characters,
+        re-reading the budget for every batch. A single long record still
+        forms its own batch.
+        """
+        batch, chars = [], 0
+
+        for record in records:
+            size = len(record.text)
+            if batch and chars + size > self.batch_chars:
+                yield batch
+                batch, chars = [], 0
+
+            batch.append(record)
+            chars += size
+
+        if batch:
+            yield batch
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 from dataclasses import dataclass
 
 
@@ -6,9 +6,18 @@ from dataclasses import dataclass
 class DocumentRecord:
     doc_id: str        # "0", "1", ... for TXT OR bib_id for BIB
     text: str          # normalized text
+    attribute: Optional[str] = None  # source field for BIB/CSV inputs
 
 
 @dataclass
 class PreprocessedDocument:
     doc_id: str
     tokens: List[str]
+    attribute: Optional[str] = None
+
+
+@dataclass
+class TxtByteRange:
+    start: int         # byte offset of the first line in the range
+    end: int           # byte offset after the last line in the range
+    first_line: int    # 1-based line number of the first line
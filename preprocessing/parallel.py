@@ -0,0 +1,94 @@
+import logging
+import multiprocessing
+import os
+import sys
+
+from collections import deque
+from concurrent.futures import (
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from itertools import chain, islice
+from typing import Callable, Iterable, Iterator, Literal, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+ExecutorKind = Literal["auto", "thread", "process"]
+
+
+def resolve_workers(workers: int) -> int:
+    """0 or less means one worker per core."""
+    return workers if workers > 0 else os.cpu_count() or 1
+
+
+def gil_enabled() -> bool:
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled() if is_gil_enabled else True
+
+
+def check_executor(kind: str) -> None:
+    if kind not in ("auto", "thread", "process"):
+        raise ValueError(f"Unknown executor '{kind}'.")
+
+
+def _make_executor(kind: ExecutorKind, workers: int) -> Executor:
+    # `re` holds the GIL while matching, so threads only scale on
+    # free-threaded builds
+    if kind == "auto":
+        kind = "process" if gil_enabled() else "thread"
+
+    logger.info("Loading with %s %s workers.", workers, kind)
+
+    if kind == "thread":
+        return ThreadPoolExecutor(max_workers=workers)
+
+    # Forking a threaded process with spaCy loaded (e.g. inside the worker
+    # service) can deadlock, workers start from a clean process instead
+    methods = multiprocessing.get_all_start_methods()
+    method = "forkserver" if "forkserver" in methods else "spawn"
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context(method)
+    )
+
+
+def ordered_map(
+    func: Callable[[T], R],
+    chunks: Iterable[T],
+    workers: int = 1,
+    executor: ExecutorKind = "auto",
+) -> Iterator[R]:
+    """
+    Apply `func` to every chunk on a worker pool and yield the results in
+    chunk order, each one as soon as it and all chunks before it finished.
+
+    Chunks are pulled lazily and at most two per worker are in flight, so
+    results are consumed while later chunks are still being processed.
+    With a single worker or chunk, everything runs inline. For processes,
+    `func` must be a module-level function.
+    """
+    # Checked even when everything runs inline, so small inputs fail too
+    check_executor(executor)
+
+    workers = resolve_workers(workers)
+    chunks = iter(chunks)
+    head = list(islice(chunks, 2)) if workers > 1 else []
+
+    if len(head) < 2:
+        for chunk in chain(head, chunks):
+            yield func(chunk)
+        return
+
+    with _make_executor(executor, workers) as pool:
+        pending = deque()
+
+        for chunk in chain(head, chunks):
+            pending.append(pool.submit(func, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
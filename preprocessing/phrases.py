@@ -0,0 +1,148 @@
+import hashlib
+import json
+import logging
+import math
+
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Literal
+
+logger = logging.getLogger(__name__)
+
+
+class PhraseModel:
+    """
+    Statistical collocation detection for n-grams.
+
+    `update` streams over tokenized sentences and counts unigrams and
+    n-grams, `fit` keeps the n-grams that occur at least `min_count` times
+    and whose association score reaches `threshold`. Only those phrases are
+    emitted afterwards instead of every contiguous n-gram.
+
+    Scores generalize (N)PMI to n tokens:
+
+        pmi  = log(p(w1..wn) / (p(w1) * ... * p(wn)))
+        npmi = pmi / ((n - 1) * -log p(w1..wn))
+
+    so NPMI is 1 for tokens that only occur together and 0 for independent
+    ones, for every n.
+    """
+
+    def __init__(
+        self,
+        ngram_min: int = 2,
+        ngram_max: int = 3,
+        threshold: float = 0.5,
+        min_count: int = 5,
+        scoring: Literal["npmi", "pmi"] = "npmi",
+    ):
+        if scoring not in ("npmi", "pmi"):
+            raise ValueError(f"Unknown phrase scoring '{scoring}'.")
+
+        self.ngram_min = max(ngram_min, 2)
+        self.ngram_max = ngram_max
+        self.threshold = threshold
+        self.min_count = min_count
+        self.scoring = scoring
+
+        self.unigram_counts: Counter = Counter()
+        self.ngram_counts: Counter = Counter()
+        self.total_tokens = 0
+        self.phrases: Dict[str, float] = {}
+
+    def update(self, sentences: Iterable[List[str]]) -> None:
+        for tokens in sentences:
+            self.unigram_counts.update(tokens)
+            self.total_tokens += len(tokens)
+
+            for n in range(self.ngram_min, self.ngram_max + 1):
+                for i in range(len(tokens) - n + 1):
+                    self.ngram_counts[tuple(tokens[i:i + n])] += 1  # fmt: off
+
+    def score(self, ngram: tuple, count: int) -> float:
+        total = self.total_tokens
+        log_p_ngram = math.log(count / total)
+        pmi = log_p_ngram - sum(
+            math.log(self.unigram_counts[token] / total) for token in ngram
+        )
+
+        if self.scoring == "pmi":
+            return pmi
+        if log_p_ngram == 0:
+            return 1.0
+        return pmi / ((len(ngram) - 1) * -log_p_ngram)
+
+    def fit(self) -> "PhraseModel":
+        self.phrases = {
+            " ".join(ngram): round(score, 6)
+            for ngram, count in self.ngram_counts.items()
+            if count >= self.min_count
+            and (score := self.score(ngram, count)) >= self.threshold
+        }
+
+        logger.info(
+            "Phrase model kept %s of %s candidate n-grams.",
+            len(self.phrases),
+            len(self.ngram_counts),
+        )
+
+        # Counts are only needed for fitting
+        self.unigram_counts.clear()
+        self.ngram_counts.clear()
+        return self
+
+    def phrases_in(self, tokens: List[str]) -> List[str]:
+        """Significant phrases of one sentence, in n-gram emission order."""
+        found = []
+
+        for n in range(self.ngram_min, self.ngram_max + 1):
+            for i in range(len(tokens) - n + 1):
+                ngram = " ".join(tokens[i:i + n])  # fmt: off
+                if ngram in self.phrases:
+                    found.append(ngram)
+
+        return found
+
+    def settings(self) -> Dict[str, object]:
+        return {
+            "ngram_min": self.ngram_min,
+            "ngram_max": self.ngram_max,
+            "threshold": self.threshold,
+            "min_count": self.min_count,
+            "scoring": self.scoring,
+        }
+
+    def digest(self) -> str:
+        """Hash of the settings and the kept phrases."""
+        data = json.dumps(
+            [self.settings(), sorted(self.phrases)], ensure_ascii=False
+        )
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def save(self, path: str) -> None:
+        data = {**self.settings(), "phrases": self.phrases}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+        logger.info("Phrase model saved to: %s", path)
+
+    @classmethod
+    def load(cls, path: str) -> "PhraseModel":
+        with open(Path(path), "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        model = cls(
+            ngram_min=data["ngram_min"],
+            ngram_max=data["ngram_max"],
+            threshold=data["threshold"],
+            min_count=data["min_count"],
+            scoring=data["scoring"],
+        )
+        model.phrases = data["phrases"]
+
+        logger.info(
+            "Loaded phrase model with %s phrases from: %s",
+            len(model.phrases),
+            path,
+        )
+        return model
@@ -0,0 +1,232 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import tracemalloc
+
+from collections import Counter
+from pathlib import Path
+from typing import List, Literal, Optional
+
+logger = logging.getLogger(__name__)
+
+TOP_ENTRIES = 50
+
+_PROFILE_LOCK = threading.Lock()
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of one thread from a background thread.
+
+    The collected stacks are written in the collapsed format
+    (`frame;frame;frame count`) understood by flamegraph.pl, speedscope
+    and inferno, so a flamegraph can be rendered from the artifact.
+    """
+
+    def __init__(
+        self, interval: float = 0.005, thread_id: Optional[int] = None
+    ):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _frame_name(frame) -> str:
+        code = frame.f_code
+        filename = os.path.basename(code.co_filename)
+        return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+    def _sample(self) -> None:
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+
+        stack = []
+        while frame is not None:
+            stack.append(self._frame_name(frame))
+            frame = frame.f_back
+
+        self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def write_collapsed(self, path: Path) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def write_top(self, path: Path, limit: int = TOP_ENTRIES) -> None:
+        """Frames with the most samples on top (self) and anywhere (total)."""
+        own: Counter = Counter()
+        total: Counter = Counter()
+
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+
+        samples = max(self.samples, 1)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(
+                f"{self.samples} samples every {self.interval * 1000:.1f} ms"
+                "\n\n"
+            )
+            for title, counter in (("Self", own), ("Total", total)):
+                f.write(f"{title}:\n")
+                for frame, count in counter.most_common(limit):
+                    f.write(
+                        f"{100 * count / samples:6.2f}% {count:8d}  {frame}\n"
+                    )
+                f.write("\n")
+
+
+class RunProfiler:
+    """
+    Context manager that profiles a whole run and writes report files to
+    `output_dir`. The paths of all written reports end up in `artifacts`.
+
+    - "sampling": collapsed stacks plus a top-frames summary
+    - "cprofile": pstats dump plus a cumulative-time summary
+    - `trace_allocations`: tracemalloc top allocators by line
+    """
+
+    def __init__(
+        self,
+        output_dir: Path,
+        mode: Literal["sampling", "cprofile"] = "sampling",
+        trace_allocations: bool = False,
+        interval: float = 0.005,
+    ):
+        if mode not in ("sampling", "cprofile"):
+            raise ValueError(f"Unknown profiler '{mode}'.")
+
+        self.output_dir = Path(output_dir)
+        self.mode = mode
+        self.trace_allocations = trace_allocations
+        self.interval = interval
+        self.artifacts: List[Path] = []
+
+        self._sampler: Optional[SamplingProfiler] = None
+        self._cprofile: Optional[cProfile.Profile] = None
+
+    def __enter__(self):
+        # cProfile and tracemalloc are process-wide, concurrent profiled runs
+        # (e.g. in the worker service) take turns
+        if not _PROFILE_LOCK.acquire(blocking=False):
+            logger.info("Waiting for another profiled run to finish...")
+            _PROFILE_LOCK.acquire()
+
+        try:
+            if self.trace_allocations:
+                tracemalloc.start()
+
+            if self.mode == "sampling":
+                self._sampler = SamplingProfiler(interval=self.interval)
+                self._sampler.start()
+            else:
+                self._cprofile = cProfile.Profile()
+                self._cprofile.enable()
+        except BaseException:
+            self._stop()
+            _PROFILE_LOCK.release()
+            raise
+
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # A failing report must not replace the run's own outcome
+        try:
+            snapshot, peak = self._stop()
+            self._write_reports(snapshot, peak)
+        except Exception:
+            logger.exception("Writing profiling reports failed.")
+        finally:
+            _PROFILE_LOCK.release()
+
+        return False
+
+    def _stop(self):
+        """Stop all profilers, returning the allocation snapshot if any."""
+        snapshot, peak = None, 0
+
+        if self._sampler is not None:
+            self._sampler.stop()
+        if self._cprofile is not None:
+            self._cprofile.disable()
+
+        if self.trace_allocations and tracemalloc.is_tracing():
+            try:
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+
+        return snapshot, peak
+
+    def _write_reports(self, snapshot, peak: int) -> None:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
+        if self._sampler is not None:
+            self._write(self._sampler.write_collapsed, "profile.collapsed")
+            self._write(self._sampler.write_top, "profile_top.txt")
+
+        if self._cprofile is not None:
+            self._write(self._cprofile.dump_stats, "profile.pstats")
+            self._write(self._write_pstats_top, "profile_top.txt")
+
+        if snapshot is not None:
+            self._write(
+                lambda path: self._write_allocations(path, snapshot, peak),
+                "allocations_top.txt",
+            )
+
+        logger.info(
+            "Profiling reports written: %s",
+            ", ".join(str(p) for p in self.artifacts),
+        )
+
+    def _write(self, writer, name: str) -> None:
+        path = self.output_dir / name
+        writer(path)
+        self.artifacts.append(path)
+
+    def _write_pstats_top(self, path: Path) -> None:
+        stream = io.StringIO()
+        stats = pstats.Stats(self._cprofile, stream=stream)
+        stats.sort_stats("cumulative").print_stats(TOP_ENTRIES)
+        path.write_text(stream.getvalue(), encoding="utf-8")
+
+    @staticmethod
+    def _write_allocations(path: Path, snapshot, peak: int) -> None:
+        snapshot = snapshot.filter_traces(
+            (tracemalloc.Filter(False, tracemalloc.__file__),)
+        )
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"Peak traced memory: {peak / (1024 * 1024):.1f} MB\n\n")
+            for stat in snapshot.statistics("lineno")[:TOP_ENTRIES]:
+                f.write(f"{stat}\n")
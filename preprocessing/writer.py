@@ -0,0 +1,110 @@
+import logging
+import pickle
+import tempfile
+
+from typing import IO, Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BUFFERED = 10000
+
+
+class OrderedWriter:
+    """
+    Writes items in input order while they arrive in any order.
+
+    Items are pushed with their input position. Contiguous runs starting at
+    the next expected position are handed to `write` immediately, everything
+    else waits in a reorder buffer. When the buffer holds more than
+    `max_buffered` items, the ones furthest from being written are spilled
+    to a temporary file and read back when their turn comes.
+
+    Positions that never arrive do not block the output forever: `close`
+    writes whatever is left in position order.
+    """
+
+    def __init__(
+        self,
+        write: Callable[[Any], None],
+        max_buffered: int = DEFAULT_MAX_BUFFERED,
+    ):
+        self._write = write
+        self.max_buffered = max(max_buffered, 1)
+        self.next_position = 0
+
+        self._buffer: Dict[int, Any] = {}
+        self._spilled: Dict[int, Tuple[int, int]] = {}
+        self._spill_file: Optional[IO[bytes]] = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._close_spill_file()
+
+    def push(self, position: int, item: Any) -> None:
+        if (
+            position < self.next_position
+            or position in self._buffer
+            or position in self._spilled
+        ):
+            raise ValueError(f"Position {position} was already pushed.")
+
+        self._buffer[position] = item
+        self._flush_contiguous()
+
+        if len(self._buffer) > self.max_buffered:
+            self._spill()
+
+    def close(self) -> None:
+        self._flush_contiguous()
+
+        # Gaps that were never filled, write the rest in order
+        for position in sorted({*self._buffer, *self._spilled}):
+            self._write(self._take(position))
+            self.next_position = position + 1
+
+        self._close_spill_file()
+
+    def _take(self, position: int) -> Any:
+        if position in self._buffer:
+            return self._buffer.pop(position)
+
+        offset, length = self._spilled.pop(position)
+        self._spill_file.seek(offset)
+        return pickle.loads(self._spill_file.read(length))
+
+    def _flush_contiguous(self) -> None:
+        while (
+            self.next_position in self._buffer
+            or self.next_position in self._spilled
+        ):
+            self._write(self._take(self.next_position))
+            self.next_position += 1
+
+    def _spill(self) -> None:
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile()
+
+        keep = self.max_buffered // 2
+        positions = sorted(self._buffer)[keep:]
+
+        logger.debug("Spilling %s buffered items to disk.", len(positions))
+
+        self._spill_file.seek(0, 2)
+        for position in positions:
+            data = pickle.dumps(
+                self._buffer.pop(position), protocol=pickle.HIGHEST_PROTOCOL
+            )
+            self._spilled[position] = (self._spill_file.tell(), len(data))
+            self._spill_file.write(data)
+
+    def _close_spill_file(self) -> None:
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+        self._buffer.clear()
+        self._spilled.clear()
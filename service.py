@@ -0,0 +1,356 @@
+"""
+Long-running worker that keeps Preprocessor instances (and their spaCy
+models) warm between jobs.
+
+Jobs are submitted over a small local HTTP interface::
+
+    POST /jobs   {"entrypoint": "preprocess_txt_file", "env": {...}}
+    GET  /health
+
+The ``env`` object holds exactly the variables the scystream entrypoint
+would read from the environment. They take precedence over variables set
+on the worker process, which fill in anything a job leaves out. Each job
+gets its own working directory for downloads and overwritten files, so
+concurrent jobs never share state.
+
+Start the worker with ``python -m service --port 8080``.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import tempfile
+import threading
+import time
+import uuid
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Type
+
+from scystream.sdk.env.settings import EnvSettings
+
+from main import (
+    PreprocessBIB,
+    PreprocessCSV,
+    PreprocessParquet,
+    PreprocessTXT,
+    _preprocessor_kwargs,
+    preprocess_bib_file,
+    preprocess_csv_file,
+    preprocess_parquet_file,
+    preprocess_txt_file,
+)
+from preprocessing.core import Preprocessor
+
+logger = logging.getLogger(__name__)
+
+# The undecorated functions take the settings object directly
+ENTRYPOINTS: Dict[str, Tuple[Type[EnvSettings], Callable]] = {
+    "preprocess_txt_file": (PreprocessTXT, preprocess_txt_file.__wrapped__),
+    "preprocess_bib_file": (PreprocessBIB, preprocess_bib_file.__wrapped__),
+    "preprocess_csv_file": (PreprocessCSV, preprocess_csv_file.__wrapped__),
+    "preprocess_parquet_file": (
+        PreprocessParquet,
+        preprocess_parquet_file.__wrapped__,
+    ),
+}
+
+HTTP_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+
+
+class JobError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class PreprocessorPool:
+    """
+    Keeps idle Preprocessor instances keyed by their constructor arguments.
+
+    An instance is handed to one job at a time, so `Preprocessor.documents`
+    is never shared between concurrent jobs. Jobs with the same settings
+    reuse the loaded model instead of paying the spaCy startup cost again.
+
+    At most `max_idle` instances are kept warm in total. When a returned
+    instance exceeds that, the least recently used ones are dropped.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[..., Preprocessor] = Preprocessor,
+        max_idle: int = 4,
+    ):
+        self.factory = factory
+        self.max_idle = max_idle
+        self._idle: OrderedDict[tuple, List[Preprocessor]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(kwargs: dict) -> tuple:
+        return tuple(sorted(kwargs.items()))
+
+    @contextmanager
+    def acquire(self, **kwargs):
+        key = self._key(kwargs)
+
+        with self._lock:
+            idle = self._idle.get(key)
+            instance = idle.pop() if idle else None
+
+        if instance is None:
+            logger.info("No warm Preprocessor for %s, loading one.", key)
+            instance = self.factory(**kwargs)
+
+        try:
+            yield instance
+        finally:
+            instance.documents = []
+            instance.phrase_model = None
+            with self._lock:
+                self._idle.setdefault(key, []).append(instance)
+                self._idle.move_to_end(key)
+                self._evict()
+
+    def _evict(self) -> None:
+        # Oldest keys first, within a key the longest idle instance
+        while self._warm_count() > self.max_idle:
+            key, idle = next(iter(self._idle.items()))
+            idle.pop(0)
+            logger.info("Dropping idle Preprocessor for %s.", key)
+            if not idle:
+                del self._idle[key]
+
+    def _warm_count(self) -> int:
+        return sum(len(idle) for idle in self._idle.values())
+
+    def warm_count(self) -> int:
+        with self._lock:
+            return self._warm_count()
+
+
+class PreprocessingService:
+    def __init__(
+        self,
+        pool: Optional[PreprocessorPool] = None,
+        max_concurrency: int = 2,
+        work_dir: Optional[str] = None,
+        entrypoints: Optional[Dict[str, Tuple[type, Callable]]] = None,
+    ):
+        self.pool = pool or PreprocessorPool()
+        self.max_concurrency = max_concurrency
+        self.work_dir = Path(work_dir or tempfile.gettempdir())
+        self.entrypoints = entrypoints or ENTRYPOINTS
+
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @staticmethod
+    def _build_settings(
+        settings_class: Type[EnvSettings], env: Dict[str, str], job_dir: Path
+    ) -> EnvSettings:
+        """
+        Build the entrypoint settings from the job's env values instead of
+        the process environment, with download paths moved into `job_dir`.
+
+        Values are passed to the settings classes directly (nested settings
+        by their env prefix), so they arrive exactly as sent.
+        """
+        env = {k: str(v) for k, v in env.items()}
+
+        for name, field in settings_class.model_fields.items():
+            if name.endswith("_DOWNLOAD_PATH"):
+                default_name = Path(str(field.default)).name
+                env[name] = str(job_dir / default_name)
+
+        nested = settings_class._basesettings_fields()
+        values = {
+            key: value
+            for key, value in env.items()
+            if key in settings_class.model_fields and key not in nested
+        }
+
+        for name, nested_class in nested.items():
+            prefix = nested_class.model_config.get("env_prefix", "")
+            values[name] = nested_class(
+                **{
+                    key[len(prefix):]: value  # fmt: off
+                    for key, value in env.items()
+                    if key.startswith(prefix)
+                    and key[len(prefix):] in nested_class.model_fields
+                }
+            )
+
+        return settings_class(**values)
+
+    def run_job(self, job_id: str, payload: dict) -> dict:
+        """Run one job synchronously, used from the worker threads."""
+        if not isinstance(payload, dict):
+            raise JobError(400, "Job payload must be a JSON object.")
+
+        name = payload.get("entrypoint")
+        if name not in self.entrypoints:
+            raise JobError(404, f"Unknown entrypoint '{name}'.")
+
+        env = payload.get("env") or {}
+        if not isinstance(env, dict):
+            raise JobError(400, "'env' must be a JSON object.")
+
+        settings_class, func = self.entrypoints[name]
+        started = time.perf_counter()
+
+        with tempfile.TemporaryDirectory(
+            prefix=f"job-{job_id}-", dir=self.work_dir
+        ) as tmp:
+            job_dir = Path(tmp)
+
+            try:
+                settings = self._build_settings(settings_class, env, job_dir)
+            except ValueError as e:
+                raise JobError(400, f"Invalid job configuration: {e}")
+
+            with self.pool.acquire(**_preprocessor_kwargs(settings)) as pre:
+                result = func(settings, preprocessor=pre, output_dir=job_dir)
+
+        return {
+            "job_id": job_id,
+            "status": "succeeded",
+            "entrypoint": name,
+            "documents": len(result or []),
+            "duration_seconds": round(time.perf_counter() - started, 4),
+        }
+
+    async def submit(self, payload: dict) -> dict:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        job_id = uuid.uuid4().hex[:12]
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, self.run_job, job_id, payload
+            )
+
+    async def _route(self, method: str, path: str, body: bytes):
+        if path == "/health":
+            if method != "GET":
+                return 405, {"error": "Use GET for /health."}
+            return 200, {"status": "ok", "warm": self.pool.warm_count()}
+
+        if path == "/jobs":
+            if method != "POST":
+                return 405, {"error": "Use POST for /jobs."}
+            try:
+                payload = json.loads(body or b"{}")
+            except json.JSONDecodeError as e:
+                return 400, {"error": f"Invalid JSON: {e}"}
+
+            try:
+                return 200, await self.submit(payload)
+            except JobError as e:
+                return e.status, {"status": "failed", "error": str(e)}
+            except Exception as e:
+                logger.exception("Job failed.")
+                return 500, {"status": "failed", "error": str(e)}
+
+        return 404, {"error": f"Unknown path '{path}'."}
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        try:
+            request_line = await reader.readline()
+            parts = request_line.decode("latin-1").split()
+            if len(parts) < 2:
+                status, response = 400, {"error": "Malformed request."}
+            else:
+                method, path = parts[0].upper(), parts[1]
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get("content-length", 0) or 0)
+                    if length < 0:
+                        raise ValueError(length)
+                    body = await reader.readexactly(length) if length else b""
+                except ValueError:
+                    status, response = 400, {
+                        "error": "Invalid Content-Length header."
+                    }
+                except asyncio.IncompleteReadError:
+                    status, response = 400, {
+                        "error": "Request body shorter than Content-Length."
+                    }
+                else:
+                    status, response = await self._route(method, path, body)
+
+            data = json.dumps(response).encode("utf-8")
+            writer.write(
+                (
+                    f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    "Connection: close\r\n\r\n"
+                ).encode("latin-1")
+                + data
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8080):
+        server = await asyncio.start_server(
+            self.handle_connection, host=host, port=port
+        )
+        logger.info(
+            "Preprocessing service listening on %s:%s (concurrency=%s)",
+            host,
+            port,
+            self.max_concurrency,
+        )
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the preprocessing worker service."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-concurrency", type=int, default=2)
+    parser.add_argument("--work-dir", default=None)
+    parser.add_argument(
+        "--max-idle",
+        type=int,
+        default=4,
+        help="Warm Preprocessor instances kept across all settings.",
+    )
+    args = parser.parse_args()
+
+    service = PreprocessingService(
+        pool=PreprocessorPool(max_idle=args.max_idle),
+        max_concurrency=args.max_concurrency,
+        work_dir=args.work_dir,
+    )
+    asyncio.run(service.serve(host=args.host, port=args.port))
+
+
+if __name__ == "__main__":
+    main()
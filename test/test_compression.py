@@ -0,0 +1,77 @@
+import gzip
+
+import pytest
+import zstandard
+
+from types import SimpleNamespace
+
+import main
+from preprocessing.compression import (
+    codec_extension,
+    detect_codec,
+    open_binary,
+    open_text,
+)
+
+
+def test_detect_codec_by_extension_and_magic_bytes(tmp_path):
+    plain = tmp_path / "input.txt"
+    plain.write_text("plain text")
+    assert detect_codec(plain) is None
+
+    # Downloads keep their configured name, only the content tells
+    gz = tmp_path / "gz_input.txt"
+    gz.write_bytes(gzip.compress(b"compressed"))
+    assert detect_codec(gz) == "gzip"
+
+    zst = tmp_path / "zst_input.txt"
+    zst.write_bytes(zstandard.ZstdCompressor().compress(b"compressed"))
+    assert detect_codec(zst) == "zstd"
+
+    assert detect_codec(tmp_path / "missing.txt.zst") == "zstd"
+
+
+@pytest.mark.parametrize("name", ["out.txt", "out.txt.gz", "out.txt.zst"])
+def test_open_text_round_trip(tmp_path, name):
+    path = tmp_path / name
+    lines = [f"line {i} äöü\n" for i in range(1000)]
+
+    with open_text(path, "w") as f:
+        f.writelines(lines)
+
+    with open_text(path) as f:
+        assert list(f) == lines
+
+    with open_binary(path) as f:
+        assert f.read().decode("utf-8") == "".join(lines)
+
+    if name != "out.txt":
+        assert path.stat().st_size < len("".join(lines).encode("utf-8"))
+
+
+def test_codec_extension_rejects_unknown_codec():
+    assert codec_extension("none") == ""
+    assert codec_extension("zstd") == "zst"
+
+    with pytest.raises(ValueError):
+        codec_extension("brotli")
+
+
+@pytest.mark.parametrize(
+    "entrypoint", [main.preprocess_txt_file, main.preprocess_bib_file]
+)
+def test_unknown_output_compression_fails_before_download(
+    entrypoint, monkeypatch
+):
+    def download(*args):
+        raise AssertionError("input downloaded")
+
+    monkeypatch.setattr(main.S3Operations, "download", download)
+    settings = SimpleNamespace(
+        OUTPUT_COMPRESSION="zst",
+        PROFILE=False,
+        normalized_overwritten_file_output=SimpleNamespace(FILE_EXT="txt"),
+    )
+
+    with pytest.raises(ValueError, match="zst"):
+        entrypoint.__wrapped__(settings)
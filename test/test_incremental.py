@@ -0,0 +1,35 @@
+import pytest
+
+from types import SimpleNamespace
+
+from main import _preprocess_incremental
+from preprocessing.incremental import content_hash, duplicate_ids
+from preprocessing.models import DocumentRecord
+
+
+def test_content_hash_depends_on_text_and_settings():
+    base = content_hash("Dogs are running fast.", '{"ngram_max": 3}')
+
+    assert base == content_hash("Dogs are running fast.", '{"ngram_max": 3}')
+    assert base != content_hash("Dogs are running.", '{"ngram_max": 3}')
+    assert base != content_hash("Dogs are running fast.", '{"ngram_max": 2}')
+
+
+def test_duplicate_ids_lists_repeated_ids_once():
+    assert duplicate_ids(["a", "UNKNOWN_ID", "b", "UNKNOWN_ID", "a"]) == [
+        "UNKNOWN_ID",
+        "a",
+    ]
+    assert duplicate_ids(["1", "2"]) == []
+
+
+def test_incremental_run_rejects_repeated_ids_before_touching_the_db():
+    documents = [
+        DocumentRecord("UNKNOWN_ID", "First entry"),
+        DocumentRecord("UNKNOWN_ID", "Second entry"),
+    ]
+    pre = SimpleNamespace(fingerprint=lambda: "{}")
+    settings = SimpleNamespace(normalized_docs_output=None)
+
+    with pytest.raises(ValueError, match="UNKNOWN_ID"):
+        _preprocess_incremental(documents, pre, settings, keep_unchanged=False)
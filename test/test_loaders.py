@@ -1,8 +1,21 @@
+import gzip
 import os
 import tempfile
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+import zstandard
 
-from preprocessing.loader import TxtLoader, BibLoader
-from preprocessing.models import DocumentRecord
+from pathlib import Path
+from preprocessing.loader import (
+    TxtLoader,
+    BibLoader,
+    CSVLoader,
+    ParquetLoader,
+    normalize_text,
+    normalize_texts_parallel,
+)
+from preprocessing.models import DocumentRecord, PreprocessedDocument
 
 
 def test_txt_loader_reads_and_normalizes():
@@ -24,6 +37,56 @@ def test_txt_loader_reads_and_normalizes():
     assert result[1].text == "Second line"
 
 
+def test_txt_loader_splits_into_line_aligned_byte_ranges(tmp_path):
+    txt_path = tmp_path / "input.txt"
+    txt_path.write_text("first line\nsecond\n\nfourth {line}\nlast")
+
+    index = TxtLoader.build_line_index(str(txt_path))
+    assert list(index) == [0, 11, 18, 19, 33, 37]
+
+    ranges = TxtLoader.split_byte_ranges(str(txt_path), 3)
+    assert ranges[0].start == 0
+    assert ranges[-1].end == txt_path.stat().st_size
+    assert all(a.end == b.start for a, b in zip(ranges, ranges[1:]))
+
+    chunked = [
+        record
+        for byte_range in ranges
+        for record in TxtLoader.iter_records(str(txt_path), byte_range)
+    ]
+
+    assert chunked == TxtLoader.load(str(txt_path))
+    assert [r.doc_id for r in chunked] == ["1", "2", "3", "4", "5"]
+    assert chunked[3].text == "fourth line"
+
+
+def test_txt_loader_streams_compressed_input(tmp_path):
+    content = b"first line\nsecond {line}\n\nlast"
+    plain = tmp_path / "input.txt"
+    plain.write_bytes(content)
+
+    # Stored under the plain name, detected by magic bytes
+    compressed = tmp_path / "compressed.txt"
+    compressed.write_bytes(zstandard.ZstdCompressor().compress(content))
+
+    assert TxtLoader.load(str(compressed)) == TxtLoader.load(str(plain))
+
+    with pytest.raises(ValueError):
+        TxtLoader.split_byte_ranges(str(compressed), 2)
+
+    output_path = tmp_path / "output.txt.gz"
+    TxtLoader.overwrite_with_results(
+        [
+            PreprocessedDocument("2", ["second", "line"]),
+            PreprocessedDocument("1", ["first", "line"]),
+        ],
+        output_path,
+    )
+
+    with gzip.open(output_path, "rt", encoding="utf-8") as f:
+        assert f.read() == "first line\nsecond line\n"
+
+
 def test_bib_loader_extracts_attribute():
     bib_content = r"""
     @article{a,
@@ -51,3 +114,173 @@ def test_bib_loader_extracts_attribute():
 
     # Normalized abstract text
     assert record.text == "This is Bib text."
+
+
+def test_bib_loader_extracts_and_overwrites_multiple_attributes(
+    tmp_path,
+):
+    bib_path = tmp_path / "input.bib"
+    bib_path.write_text(
+        r"""
+    @article{a,
+      abstract = {This is {Bib} \textbf{text}.},
+      title = {A Title}
+    }
+    """
+    )
+
+    loader = BibLoader(file_path=str(bib_path), attribute="Title, abstract")
+    result = loader.document_records
+
+    assert [(r.doc_id, r.attribute, r.text) for r in result] == [
+        ("a", "title", "A Title"),
+        ("a", "abstract", "This is Bib text."),
+    ]
+
+    output_path = tmp_path / "output.bib"
+    loader.overwrite_with_results(
+        [
+            PreprocessedDocument("a", ["titl"], attribute="title"),
+            PreprocessedDocument("a", ["bib", "text"], attribute="abstract"),
+        ],
+        output_path,
+    )
+
+    written = output_path.read_text()
+    assert "titl" in written
+    assert "bib text" in written
+
+
+def test_csv_loader_reads_each_row_once_for_all_attributes(tmp_path):
+    csv_path = tmp_path / "input.csv"
+    csv_path.write_text(
+        "id,title,abstract\n1,First title,First abstract\n2,Second,\n"
+    )
+
+    loader = CSVLoader(
+        file_path=str(csv_path), attribute=["title", "abstract"]
+    )
+    result = loader.document_records
+
+    assert [(r.doc_id, r.attribute, r.text) for r in result] == [
+        ("1", "title", "First title"),
+        ("1", "abstract", "First abstract"),
+        ("2", "title", "Second"),
+        ("2", "abstract", ""),
+    ]
+
+
+def test_bib_and_csv_loaders_read_and_write_compressed_files(tmp_path):
+    bib_path = tmp_path / "input.bib.gz"
+    bib_path.write_bytes(
+        gzip.compress(b"@article{a,\n  abstract = {Some text}\n}\n")
+    )
+
+    bib_loader = BibLoader(file_path=str(bib_path), attribute="abstract")
+    assert [r.text for r in bib_loader.document_records] == ["Some text"]
+
+    output_path = tmp_path / "output.bib.zst"
+    bib_loader.overwrite_with_results(
+        [PreprocessedDocument("a", ["some", "text"], attribute="abstract")],
+        output_path,
+    )
+    with zstandard.open(output_path, "rt", encoding="utf-8") as f:
+        assert "abstract = {some text}" in f.read()
+
+    csv_path = tmp_path / "input.csv"
+    csv_path.write_bytes(gzip.compress(b"id,abstract\n1,First\n2,Second\n"))
+
+    csv_loader = CSVLoader(file_path=str(csv_path), attribute="abstract")
+    assert [r.text for r in csv_loader.document_records] == [
+        "First",
+        "Second",
+    ]
+
+    output_path = tmp_path / "output.csv.gz"
+    csv_loader.overwrite_with_results(
+        [PreprocessedDocument("1", ["first"], attribute="abstract")],
+        output_path,
+    )
+    with gzip.open(output_path, "rt", encoding="utf-8", newline="") as f:
+        assert f.read() == "id,abstract\n1,first\n2,Second\n"
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_normalize_texts_parallel_keeps_input_order(executor):
+    texts = [f"\\textbf{{Text}} {{{i}}}" for i in range(50)]
+
+    result = list(
+        normalize_texts_parallel(texts, 3, executor, chunk_size=7)
+    )
+
+    assert result == [normalize_text(text) for text in texts]
+    assert result[-1] == "Text 49"
+
+
+def test_csv_loader_with_workers_matches_sequential_load(tmp_path):
+    csv_path = tmp_path / "input.csv"
+    csv_path.write_text(
+        "id,title,abstract\n1,First {title},First abstract\n2,Second,\n"
+    )
+
+    parallel = CSVLoader(
+        file_path=str(csv_path), attribute="title,abstract", workers=2
+    )
+    sequential = CSVLoader(file_path=str(csv_path), attribute="title,abstract")
+
+    assert parallel.document_records == sequential.document_records
+
+
+def test_loaders_reject_unknown_executor_with_one_worker(tmp_path):
+    csv_path = tmp_path / "input.csv"
+    csv_path.write_text("id,abstract\n1,Some text\n")
+
+    with pytest.raises(ValueError, match="procs"):
+        CSVLoader(str(csv_path), "abstract", executor="procs")
+    with pytest.raises(ValueError, match="procs"):
+        BibLoader("missing.bib", "abstract", executor="procs")
+
+
+def test_parquet_loader_reads_selected_columns_in_batches():
+    table = pa.table(
+        {
+            "id": [1, 2, 3],
+            "title": ["Ignore me", "Ignore me", "Ignore me"],
+            "abstract": ["This is {Bib} text.", None, "Third"],
+        }
+    )
+
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".parquet") as f:
+        fname = f.name
+    pq.write_table(table, fname)
+
+    loader = ParquetLoader(
+        file_path=fname, attribute="abstract", id_column="id", batch_size=2
+    )
+    result = loader.document_records
+    os.unlink(fname)
+
+    assert [r.doc_id for r in result] == ["1", "2", "3"]
+    assert [r.text for r in result] == ["This is Bib text.", "", "Third"]
+
+
+def test_parquet_write_results_roundtrip(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    docs = [
+        PreprocessedDocument(doc_id="1", tokens=["dog", "run", "dog run"]),
+        PreprocessedDocument(doc_id="2", tokens=[]),
+    ]
+
+    ParquetLoader.write_results(
+        docs, Path("output.parquet"), dictionary_encode=True
+    )
+    table = pq.read_table(tmp_path / "output.parquet")
+
+    assert table.column_names == ["doc_id", "tokens"]
+    assert pa.types.is_dictionary(table.schema.field("tokens").type.value_type)
+    assert table.column("doc_id").to_pylist() == ["1", "2"]
+    assert table.column("tokens").to_pylist() == [
+        ["dog", "run", "dog run"],
+        [],
+    ]
@@ -0,0 +1,76 @@
+from preprocessing import memory
+from preprocessing.memory import MemoryGovernor
+from preprocessing.models import DocumentRecord
+
+
+def test_batches_are_bounded_by_characters():
+    governor = MemoryGovernor(batch_chars=10, min_batch_chars=1)
+    records = [
+        DocumentRecord(doc_id=str(i), text=text)
+        for i, text in enumerate(["aaaa", "bbbb", "cc", "d" * 30, "ee"])
+    ]
+
+    batches = [
+        [r.doc_id for r in batch] for batch in governor.batches(records)
+    ]
+
+    # A record longer than the budget still forms its own batch
+    assert batches == [["0", "1", "2"], ["3"], ["4"]]
+
+
+def test_governor_shrinks_and_grows_batches_around_the_limit(monkeypatch):
+    governor = MemoryGovernor(
+        max_memory_mb=1000,
+        batch_chars=8000,
+        min_batch_chars=1000,
+        max_batch_chars=20000,
+    )
+
+    monkeypatch.setattr(memory, "current_rss_mb", lambda: 950)
+    governor.observe()
+    assert governor.batch_chars == 4000
+
+    for _ in range(5):
+        governor.observe()
+    assert governor.batch_chars == 1000
+
+    monkeypatch.setattr(memory, "current_rss_mb", lambda: 100)
+    governor.observe()
+    assert governor.batch_chars == 1500
+
+    for _ in range(10):
+        governor.observe()
+    assert governor.batch_chars == 20000
+
+
+def test_governor_warns_once_per_crossing_of_the_limit(monkeypatch, caplog):
+    governor = MemoryGovernor(
+        max_memory_mb=1000, batch_chars=4000, min_batch_chars=1000
+    )
+
+    def warnings():
+        return [r for r in caplog.records if r.levelname == "WARNING"]
+
+    monkeypatch.setattr(memory, "current_rss_mb", lambda: 1200)
+    for _ in range(5):
+        governor.observe()
+    assert len(warnings()) == 1
+
+    monkeypatch.setattr(memory, "current_rss_mb", lambda: 900)
+    governor.observe()
+    monkeypatch.setattr(memory, "current_rss_mb", lambda: 1200)
+    governor.observe()
+    assert len(warnings()) == 2
+
+
+def test_governor_without_limit_keeps_batch_size(monkeypatch):
+    governor = MemoryGovernor(batch_chars=8000)
+
+    monkeypatch.setattr(memory, "current_rss_mb", lambda: 10**6)
+    governor.observe()
+
+    assert governor.batch_chars == 8000
+
+
+def test_current_rss_is_reported():
+    assert memory.current_rss_mb() > 0
@@ -0,0 +1,39 @@
+import time
+
+import pytest
+
+from preprocessing.parallel import ordered_map, resolve_workers
+
+
+def _slow_first(chunk):
+    # Earlier chunks finish last, the output order must not change
+    time.sleep(0.02 * (5 - chunk[0]))
+    return [value * 2 for value in chunk]
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_ordered_map_keeps_chunk_order(executor):
+    chunks = [[i, i + 10] for i in range(5)]
+
+    results = list(ordered_map(_slow_first, chunks, 3, executor))
+
+    assert results == [[2 * i, 2 * (i + 10)] for i in range(5)]
+
+
+def test_ordered_map_runs_inline_for_one_worker():
+    assert list(ordered_map(len, [[1], [1, 2]], workers=1)) == [1, 2]
+    assert list(ordered_map(len, [], workers=4)) == []
+
+
+def test_ordered_map_rejects_unknown_executor():
+    with pytest.raises(ValueError):
+        list(ordered_map(len, [[1], [2]], 2, "fiber"))
+
+    # Even when nothing would run on a pool
+    with pytest.raises(ValueError):
+        list(ordered_map(len, [[1]], 1, "fiber"))
+
+
+def test_resolve_workers_defaults_to_cores():
+    assert resolve_workers(3) == 3
+    assert resolve_workers(0) >= 1
@@ -0,0 +1,137 @@
+import pytest
+
+from types import SimpleNamespace
+
+from botocore.exceptions import ClientError
+
+import main
+from preprocessing import core
+from preprocessing.phrases import PhraseModel
+
+SENTENCES = [
+    ["new", "york", "city", "grows"],
+    ["visit", "new", "york", "today"],
+    ["new", "york", "city", "sleeps"],
+    ["the", "city", "the", "new"],
+    ["the", "visit", "grows", "today"],
+] * 3
+
+
+def test_phrase_model_keeps_only_collocations():
+    model = PhraseModel(ngram_min=2, ngram_max=3, threshold=0.5, min_count=3)
+    model.update(SENTENCES)
+    model.fit()
+
+    assert "new york" in model.phrases
+    assert "new york city" in model.phrases
+    # Frequent enough, but its tokens mostly occur apart
+    assert "the new" not in model.phrases
+    assert all(score >= 0.5 for score in model.phrases.values())
+
+    assert model.phrases_in(["visit", "new", "york", "today"]) == [
+        "new york"
+    ]
+
+
+def test_phrase_model_min_count_and_perfect_score():
+    model = PhraseModel(ngram_min=2, ngram_max=2, threshold=0.0, min_count=2)
+    model.update([["alpha", "beta"], ["alpha", "beta"], ["gamma", "delta"]])
+    model.fit()
+
+    assert model.phrases == {"alpha beta": 1.0}
+
+
+def test_phrase_model_save_and_load(tmp_path):
+    model = PhraseModel(ngram_min=2, ngram_max=3, threshold=0.5, min_count=3)
+    model.update(SENTENCES)
+    model.fit()
+
+    path = tmp_path / "phrases.json"
+    model.save(path)
+    loaded = PhraseModel.load(path)
+
+    assert loaded.phrases == model.phrases
+    assert loaded.ngram_max == 3
+    assert loaded.phrases_in(["visit", "new", "york"]) == ["new york"]
+
+
+def test_phrase_model_rejects_unknown_scoring():
+    with pytest.raises(ValueError):
+        PhraseModel(scoring="chi2")
+
+
+def test_unknown_ngram_mode_fails_before_loading_a_model(monkeypatch):
+    def load(*args, **kwargs):
+        raise AssertionError("spaCy model loaded")
+
+    monkeypatch.setattr(core.spacy, "load", load)
+
+    with pytest.raises(ValueError, match="ngram mode"):
+        core.Preprocessor(ngram_mode="phrase")
+
+
+def test_phrase_model_digest_tracks_phrases_and_settings():
+    model = PhraseModel(min_count=3)
+    model.update(SENTENCES)
+    model.fit()
+
+    other = PhraseModel(min_count=3)
+    other.phrases = dict(model.phrases)
+    assert other.digest() == model.digest()
+
+    other.phrases.pop("new york")
+    assert other.digest() != model.digest()
+    assert PhraseModel(min_count=4).digest() != PhraseModel().digest()
+
+
+def _fake_pre(**settings):
+    return SimpleNamespace(
+        phrase_model=None,
+        new_phrase_model=lambda: PhraseModel(**settings),
+    )
+
+
+def test_load_phrase_model_from_store(tmp_path, monkeypatch):
+    stored = PhraseModel(min_count=3)
+    stored.update(SENTENCES)
+    stored.fit()
+    stored.save(tmp_path / "stored.json")
+
+    def download(settings, local_path):
+        assert (settings.FILE_PATH, settings.FILE_NAME) == ("models", "abc")
+        (tmp_path / "stored.json").replace(local_path)
+
+    monkeypatch.setattr(main.S3Operations, "download", download)
+    target = SimpleNamespace(FILE_PATH="models", FILE_NAME="abc")
+    pre = _fake_pre(min_count=3)
+
+    assert main._load_phrase_model(pre, target, tmp_path / "model.json")
+    assert pre.phrase_model.phrases == stored.phrases
+
+
+def test_load_phrase_model_rejects_other_settings(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        main.S3Operations,
+        "download",
+        lambda settings, local_path: PhraseModel(min_count=3).save(
+            local_path
+        ),
+    )
+    target = SimpleNamespace(FILE_PATH="models", FILE_NAME="abc")
+
+    with pytest.raises(ValueError, match="PHRASE_MODEL_REFIT"):
+        main._load_phrase_model(
+            _fake_pre(min_count=5), target, tmp_path / "model.json"
+        )
+
+
+def test_load_phrase_model_without_stored_model(tmp_path, monkeypatch):
+    def download(settings, local_path):
+        raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+
+    monkeypatch.setattr(main.S3Operations, "download", download)
+    pre = _fake_pre()
+    target = SimpleNamespace(FILE_PATH="models", FILE_NAME="abc")
+
+    assert not main._load_phrase_model(pre, target, tmp_path / "model.json")
+    assert pre.phrase_model is None
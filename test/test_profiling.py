@@ -0,0 +1,130 @@
+import threading
+
+from types import SimpleNamespace
+
+import pytest
+
+import main
+from preprocessing.profiling import RunProfiler
+
+
+def busy_loop():
+    total = 0
+    for i in range(300_000):
+        total += i * i
+    return total
+
+
+def test_sampling_profiler_writes_collapsed_stacks(tmp_path):
+    with RunProfiler(tmp_path, mode="sampling", interval=0.001) as profiler:
+        busy_loop()
+
+    assert [p.name for p in profiler.artifacts] == [
+        "profile.collapsed",
+        "profile_top.txt",
+    ]
+
+    collapsed = (tmp_path / "profile.collapsed").read_text().splitlines()
+    assert collapsed
+    assert any("busy_loop" in line for line in collapsed)
+
+    stack, count = collapsed[0].rsplit(" ", 1)
+    assert ";" in stack
+    assert int(count) > 0
+
+
+def test_cprofile_with_allocations(tmp_path):
+    with RunProfiler(
+        tmp_path, mode="cprofile", trace_allocations=True
+    ) as profiler:
+        data = [str(i) for i in range(10_000)]
+
+    assert len(data) == 10_000
+    assert [p.name for p in profiler.artifacts] == [
+        "profile.pstats",
+        "profile_top.txt",
+        "allocations_top.txt",
+    ]
+    assert "Peak traced memory" in (
+        tmp_path / "allocations_top.txt"
+    ).read_text()
+
+
+def test_concurrent_profiled_runs_take_turns(tmp_path):
+    errors = []
+
+    def run(name):
+        try:
+            with RunProfiler(
+                tmp_path / name, mode="cprofile", trace_allocations=True
+            ) as profiler:
+                busy_loop()
+            assert len(profiler.artifacts) == 3
+        except Exception as e:
+            errors.append(e)
+
+    threads = [
+        threading.Thread(target=run, args=(f"run{i}",)) for i in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+
+
+def test_report_failure_keeps_the_run_exception(tmp_path):
+    # A file where the report directory should go
+    blocked = tmp_path / "profile"
+    blocked.write_text("")
+
+    with pytest.raises(KeyError):
+        with RunProfiler(blocked, mode="cprofile"):
+            raise KeyError("run failed")
+
+    # The profiler was released again
+    with RunProfiler(tmp_path / "next", mode="cprofile") as profiler:
+        busy_loop()
+    assert profiler.artifacts
+
+
+def test_profiled_uploads_reports_even_if_run_fails(tmp_path, monkeypatch):
+    uploads = []
+    monkeypatch.setattr(
+        main.S3Operations,
+        "upload",
+        lambda settings, path: uploads.append((settings, path)),
+    )
+
+    settings = SimpleNamespace(
+        PROFILE=True,
+        PROFILER="cprofile",
+        PROFILE_ALLOCATIONS=False,
+        PROFILE_FILE_PATH="profiles/run",
+    )
+    s3_settings = main.NormalizedTXTOutput(
+        S3_HOST="http://localhost",
+        S3_PORT=9000,
+        S3_ACCESS_KEY="key",
+        S3_SECRET_KEY="secret",
+        BUCKET_NAME="bucket",
+        FILE_PATH="out",
+        FILE_NAME="output",
+    )
+
+    try:
+        with main._profiled(settings, s3_settings, "txt", tmp_path):
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+
+    assert len(uploads) == 2
+    target, path = uploads[0]
+    assert target.BUCKET_NAME == "bucket"
+    assert target.FILE_PATH == "profiles/run"
+    assert target.FILE_NAME.startswith("txt_")
+    assert target.FILE_EXT == "pstats"
+    assert path.endswith("profile.pstats")
+    # The output settings themselves are left untouched
+    assert s3_settings.FILE_PATH == "out"
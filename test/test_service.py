@@ -0,0 +1,227 @@
+import asyncio
+import json
+
+from pydantic import create_model
+from scystream.sdk.env.settings import (
+    EnvSettings,
+    FileSettings,
+    InputSettings,
+)
+
+from main import PreprocessTXT
+from preprocessing.models import PreprocessedDocument
+from service import PreprocessorPool, PreprocessingService
+
+
+class FakePreprocessor:
+    instances = 0
+
+    def __init__(self, **kwargs):
+        FakePreprocessor.instances += 1
+        self.kwargs = kwargs
+        self.documents = []
+
+
+# The TXT entrypoint's own settings, without its S3 and DB sections
+FakeSettings = create_model(
+    "FakeSettings",
+    __base__=EnvSettings,
+    **{
+        name: (field.annotation, field.default)
+        for name, field in PreprocessTXT.model_fields.items()
+        if name not in PreprocessTXT._basesettings_fields()
+    },
+)
+
+
+class FakeFileInput(FileSettings, InputSettings):
+    __identifier__ = "fake_file"
+    FILE_EXT: str = "txt"
+
+
+class FakeFileSettings(FakeSettings):
+    fake_input: FakeFileInput
+
+
+def fake_entrypoint(settings, preprocessor, output_dir):
+    assert settings.TXT_DOWNLOAD_PATH.startswith(str(output_dir))
+    return [
+        PreprocessedDocument(doc_id="1", tokens=[settings.LANGUAGE]),
+        PreprocessedDocument(
+            doc_id="2", tokens=[preprocessor.kwargs["language"]]
+        ),
+    ]
+
+
+async def _request(port, method, path, body=b""):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n"
+        .encode() + body
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+
+    head, _, payload = response.partition(b"\r\n\r\n")
+    status = int(head.split()[1])
+    return status, json.loads(payload)
+
+
+async def _raw_request(port, data: bytes):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(data)
+    writer.write_eof()
+    response = await reader.read()
+    writer.close()
+    return int(response.split()[1])
+
+
+def test_pool_reuses_instances_per_settings():
+    FakePreprocessor.instances = 0
+    pool = PreprocessorPool(factory=FakePreprocessor)
+
+    with pool.acquire(language="en") as first:
+        first.documents = ["leftover"]
+    with pool.acquire(language="en") as second:
+        assert second is first
+        assert second.documents == []
+    with pool.acquire(language="de") as third:
+        assert third is not first
+
+    assert FakePreprocessor.instances == 2
+    assert pool.warm_count() == 2
+
+
+def test_pool_drops_least_recently_used_instances():
+    pool = PreprocessorPool(factory=FakePreprocessor, max_idle=2)
+
+    with pool.acquire(language="en") as en:
+        pass
+    with pool.acquire(language="de") as de:
+        pass
+    with pool.acquire(language="en") as again:
+        assert again is en
+    with pool.acquire(language="fr"):
+        pass
+
+    assert pool.warm_count() == 2
+    with pool.acquire(language="en") as warm:
+        assert warm is en
+    with pool.acquire(language="de") as reloaded:
+        assert reloaded is not de
+
+
+def test_pool_isolates_concurrent_jobs():
+    pool = PreprocessorPool(factory=FakePreprocessor)
+
+    with pool.acquire(language="en") as first:
+        with pool.acquire(language="en") as second:
+            assert second is not first
+
+
+def test_service_runs_jobs_over_http(tmp_path):
+    FakePreprocessor.instances = 0
+    service = PreprocessingService(
+        pool=PreprocessorPool(factory=FakePreprocessor),
+        max_concurrency=2,
+        work_dir=str(tmp_path),
+        entrypoints={"fake": (FakeSettings, fake_entrypoint)},
+    )
+
+    async def scenario():
+        server = await asyncio.start_server(
+            service.handle_connection, "127.0.0.1", 0
+        )
+        port = server.sockets[0].getsockname()[1]
+
+        async with server:
+            job = json.dumps(
+                {"entrypoint": "fake", "env": {"LANGUAGE": "de"}}
+            ).encode()
+            results = await asyncio.gather(
+                *[_request(port, "POST", "/jobs", job) for _ in range(3)]
+            )
+            health = await _request(port, "GET", "/health")
+            unknown = await _request(
+                port, "POST", "/jobs", b'{"entrypoint": "nope"}'
+            )
+            malformed = await _request(port, "POST", "/jobs", b"{")
+
+        return results, health, unknown, malformed
+
+    results, health, unknown, malformed = asyncio.run(scenario())
+
+    for status, body in results:
+        assert status == 200
+        assert body["status"] == "succeeded"
+        assert body["documents"] == 2
+
+    assert len({body["job_id"] for _, body in results}) == 3
+    assert FakePreprocessor.instances <= 2
+
+    assert health == (
+        200,
+        {"status": "ok", "warm": FakePreprocessor.instances},
+    )
+    assert unknown[0] == 404
+    assert malformed[0] == 400
+
+    # Per-job working directories are cleaned up
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_build_settings_keeps_job_values_verbatim(tmp_path):
+    env = {
+        "LANGUAGE": "Schlüsselwörter",
+        "NGRAM_MAX": 4,
+        "fake_file_S3_HOST": "http://127.0.0.1",
+        "fake_file_S3_PORT": "9000",
+        "fake_file_S3_ACCESS_KEY": "user",
+        "fake_file_S3_SECRET_KEY": 'pä$$ "wört" \\u00fc',
+        "fake_file_BUCKET_NAME": "bucket",
+        "fake_file_FILE_PATH": "",
+        "fake_file_FILE_NAME": "Eingabe",
+        "TXT_DOWNLOAD_PATH": "/elsewhere/input.txt",
+    }
+
+    settings = PreprocessingService._build_settings(
+        FakeFileSettings, env, tmp_path
+    )
+
+    assert settings.LANGUAGE == "Schlüsselwörter"
+    assert settings.NGRAM_MAX == 4
+    assert settings.fake_input.S3_SECRET_KEY == 'pä$$ "wört" \\u00fc'
+    assert settings.fake_input.S3_PORT == 9000
+    assert settings.fake_input.FILE_EXT == "txt"
+    assert settings.TXT_DOWNLOAD_PATH == str(tmp_path / "input.txt")
+
+
+def test_service_rejects_broken_requests_with_400(tmp_path):
+    service = PreprocessingService(
+        pool=PreprocessorPool(factory=FakePreprocessor),
+        work_dir=str(tmp_path),
+        entrypoints={"fake": (FakeSettings, fake_entrypoint)},
+    )
+
+    async def scenario():
+        server = await asyncio.start_server(
+            service.handle_connection, "127.0.0.1", 0
+        )
+        port = server.sockets[0].getsockname()[1]
+
+        async with server:
+            return await asyncio.gather(
+                _raw_request(
+                    port, b"POST /jobs HTTP/1.1\r\nContent-Length: x\r\n\r\n"
+                ),
+                _raw_request(
+                    port,
+                    b"POST /jobs HTTP/1.1\r\nContent-Length: 100\r\n\r\n{}",
+                ),
+                _raw_request(
+                    port, b"POST /jobs HTTP/1.1\r\nContent-Length: -1\r\n\r\n"
+                ),
+            )
+
+    assert asyncio.run(scenario()) == [400, 400, 400]
@@ -0,0 +1,52 @@
+import pytest
+
+from preprocessing.writer import OrderedWriter
+
+
+def test_ordered_writer_flushes_contiguous_runs_immediately():
+    written = []
+    writer = OrderedWriter(written.append)
+
+    writer.push(1, "b")
+    assert written == []
+
+    writer.push(0, "a")
+    assert written == ["a", "b"]
+
+    writer.push(2, "c")
+    writer.close()
+    assert written == ["a", "b", "c"]
+
+
+def test_ordered_writer_spills_to_disk_when_buffer_is_full():
+    written = []
+
+    with OrderedWriter(written.append, max_buffered=4) as writer:
+        for position in reversed(range(1, 50)):
+            writer.push(position, {"position": position})
+
+        assert len(writer._buffer) <= 4
+        assert writer._spilled
+
+        writer.push(0, {"position": 0})
+
+    assert [item["position"] for item in written] == list(range(50))
+
+
+def test_ordered_writer_writes_gaps_in_order_on_close():
+    written = []
+
+    with OrderedWriter(written.append, max_buffered=1) as writer:
+        writer.push(5, "f")
+        writer.push(2, "c")
+        writer.push(0, "a")
+
+    assert written == ["a", "c", "f"]
+
+
+def test_ordered_writer_rejects_duplicate_positions():
+    writer = OrderedWriter(lambda item: None)
+    writer.push(0, "a")
+
+    with pytest.raises(ValueError):
+        writer.push(0, "again")